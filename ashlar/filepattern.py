@@ -94,7 +94,7 @@ class FilePatternMetadata(reg.Metadata):
         return row, col
 
 
-class FilePatternReader(reg.Reader):
+class FilePatternReader(reg.TiffTileReaderMixin, reg.Reader):
 
     def __init__(self, path, pattern, overlap, pixel_size=1.0):
         # See FilePatternMetadata for an explanation of the pattern syntax.
@@ -106,9 +106,11 @@ class FileSeriesMetadata(reg.PlateMetadata):
 
     @property
     def plate_well_series(self):
-        return [
-            list([a[0] for a in v] for k, v in itertools.groupby(enumerate(self.all_series), key=lambda x: x[1][0]))
-        ]
+        if not hasattr(self, '_plate_well_series'):
+            self._plate_well_series = [
+                list([a[0] for a in v] for k, v in itertools.groupby(enumerate(self.all_series), key=lambda x: x[1][0]))
+            ]
+        return self._plate_well_series
 
     def plate_name(self, i):
         assert i == 0, "Plate index out of range"
@@ -145,7 +147,7 @@ class FileSeriesMetadata(reg.PlateMetadata):
         return self.pattern.format(**components)
 
 
-class FileSeriesReader(reg.PlateReader):
+class FileSeriesReader(reg.TiffTileReaderMixin, reg.PlateReader):
 
     def __init__(
         self, path, pattern, overlap, width, height, pixel_size=1.0,
@@ -162,7 +164,7 @@ class FileSeriesReader(reg.PlateReader):
     def read(self, series, c):
         # TODO: Address tension between non-plate and plate-aware modes
         # here and in Metadata class.
-        path = str(self.path / self.metadata.filename(series, c))
+        path = str(self.path / self.filename(series, c))
         kwargs = {}
         if self.metadata.multi_channel_tiles:
             kwargs['key'] = c
@@ -171,3 +173,6 @@ class FileSeriesReader(reg.PlateReader):
             # processing code only handles 2D image arrays!
             kwargs['key'] = 0
         return skimage.io.imread(path, **kwargs)
+
+    def filename(self, series, c):
+        return self.metadata.filename(series, c)
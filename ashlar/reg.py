@@ -6,42 +6,52 @@ import io
 import uuid
 import struct
 import pathlib
-import jnius_config
+import collections
+import threading
+import concurrent.futures
 import numpy as np
 import scipy.spatial.distance
+import scipy.special
 import scipy.fft
 import skimage.util
 import skimage.util.dtype
 import skimage.io
-import skimage.exposure
-import skimage.transform
-import sklearn.linear_model
-import networkx as nx
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
 from . import utils
 from . import thumbnail
 from . import __version__ as _version
 
 
-if not jnius_config.vm_running:
-    pkg_root = pathlib.Path(__file__).parent.resolve()
-    bf_jar_path = pkg_root / 'jars' / 'loci_tools.jar'
-    if not bf_jar_path.exists():
-        raise RuntimeError("loci_tools.jar missing from distribution"
-                           " (expected it at %s)" % bf_jar_path)
-    jnius_config.add_classpath(str(bf_jar_path))
-
-import jnius
-
-DebugTools = jnius.autoclass('loci.common.DebugTools')
-IFormatReader = jnius.autoclass('loci.formats.IFormatReader')
-MetadataRetrieve = jnius.autoclass('ome.xml.meta.MetadataRetrieve')
-ServiceFactory = jnius.autoclass('loci.common.services.ServiceFactory')
-OMEXMLService = jnius.autoclass('loci.formats.services.OMEXMLService')
-ChannelSeparator = jnius.autoclass('loci.formats.ChannelSeparator')
-UNITS = jnius.autoclass('ome.units.UNITS')
-DebugTools.enableLogging("ERROR")
+# Starting the JVM for Bio-Formats takes seconds and a lot of memory, so it is
+# deferred until a BioformatsReader is actually used. See _init_bioformats.
+jnius = None
+
+
+def _init_bioformats():
+    """Start the JVM and look up the Bio-Formats classes, if not done yet."""
+    global jnius, DebugTools, IFormatReader, MetadataRetrieve, ServiceFactory
+    global OMEXMLService, ChannelSeparator, Memoizer, JavaFile
+    if jnius is not None:
+        return
+    import jnius_config
+    if not jnius_config.vm_running:
+        pkg_root = pathlib.Path(__file__).parent.resolve()
+        bf_jar_path = pkg_root / 'jars' / 'loci_tools.jar'
+        if not bf_jar_path.exists():
+            raise RuntimeError("loci_tools.jar missing from distribution"
+                               " (expected it at %s)" % bf_jar_path)
+        jnius_config.add_classpath(str(bf_jar_path))
+    import jnius as _jnius
+    DebugTools = _jnius.autoclass('loci.common.DebugTools')
+    IFormatReader = _jnius.autoclass('loci.formats.IFormatReader')
+    MetadataRetrieve = _jnius.autoclass('ome.xml.meta.MetadataRetrieve')
+    ServiceFactory = _jnius.autoclass('loci.common.services.ServiceFactory')
+    OMEXMLService = _jnius.autoclass('loci.formats.services.OMEXMLService')
+    ChannelSeparator = _jnius.autoclass('loci.formats.ChannelSeparator')
+    Memoizer = _jnius.autoclass('loci.formats.Memoizer')
+    JavaFile = _jnius.autoclass('java.io.File')
+    DebugTools.enableLogging("ERROR")
+    # Set this last, as it marks initialization as complete.
+    jnius = _jnius
 
 
 # TODO:
@@ -87,11 +97,14 @@ class Metadata(object):
     @property
     def positions(self):
         if not hasattr(self, '_positions'):
-            self._positions = np.vstack([
-                self.tile_position(i) for i in range(self._num_images)
-            ])
+            self._positions = self._compute_positions()
         return self._positions
 
+    def _compute_positions(self):
+        return np.vstack([
+            self.tile_position(i) for i in range(self._num_images)
+        ])
+
     @property
     def size(self):
         if not hasattr(self, '_size'):
@@ -111,6 +124,11 @@ class Metadata(object):
         return self.positions.min(axis=0)
 
 
+WellSnapshot = collections.namedtuple(
+    'WellSnapshot', 'series positions size origin'
+)
+
+
 class PlateMetadata(Metadata):
 
     def __init__(self):
@@ -140,13 +158,45 @@ class PlateMetadata(Metadata):
             raise ValueError("plate and well must be both set or both None")
         self.active_plate = plate
         self.active_well = well
+        self._well_series = None
+        self._well_snapshot = None
+
+    @property
+    def well_snapshot(self):
+        """Read-only arrays describing the active plate and well.
+
+        The snapshot is built on first use after each set_active_plate_well
+        call, so the hot paths that look up series numbers and positions don't
+        repeat that work.
+
+        """
+        if self._well_snapshot is None:
+            series = self.active_series
+            positions = Metadata.positions.fget(self)[series]
+            origin = (
+                positions.min(axis=0) if len(positions) else np.zeros(2)
+            )
+            size = self.size.copy()
+            for a in positions, size, origin:
+                a.setflags(write=False)
+            self._well_snapshot = WellSnapshot(series, positions, size, origin)
+        return self._well_snapshot
 
     @property
     def active_series(self):
-        if self.active_plate is None:
-            return range(self._num_images)
-        else:
-            return self.plate_well_series[self.active_plate][self.active_well]
+        # Kept apart from the rest of the snapshot since subclasses need the
+        # series numbers before positions and sizes are available.
+        if self._well_series is None:
+            if self.active_plate is None:
+                series = np.arange(self._num_images)
+            else:
+                series = np.array(
+                    self.plate_well_series[self.active_plate][self.active_well],
+                    dtype=int
+                )
+            series.setflags(write=False)
+            self._well_series = series
+        return self._well_series
 
     @property
     def plate_names(self):
@@ -171,7 +221,11 @@ class PlateMetadata(Metadata):
 
     @Metadata.positions.getter
     def positions(self):
-        return Metadata.positions.fget(self)[self.active_series]
+        return self.well_snapshot.positions
+
+    @Metadata.origin.getter
+    def origin(self):
+        return self.well_snapshot.origin
 
     # FIXME Metadata.grid_dimensions should be overriden here or removed.
 
@@ -181,6 +235,40 @@ class Reader(object):
     def read(self, series, c):
         raise NotImplementedError
 
+    def read_region(self, series, c, y, x, h, w):
+        """Read the h x w region of an image plane with top-left corner (y, x).
+
+        The region is clipped to the image bounds. Subclasses should override
+        this if they can avoid reading the whole image; by default the full
+        image is read and cropped.
+
+        """
+        img = self.read(series, c)
+        return img[y:y+h, x:x+w]
+
+    def read_many(self, series_list, channels):
+        """Yield a (channel, y, x) image array for each series in series_list.
+
+        Formats that store all channels of a tile together should override this
+        to read each tile in one go.
+
+        """
+        for series in series_list:
+            yield np.stack([self.read(series, c) for c in channels])
+
+    def prefetch(self, keys):
+        """Announce upcoming reads as an iterable of (series, c) tuples.
+
+        This is only a hint, and by default it is ignored. See
+        PrefetchingReader.
+
+        """
+        pass
+
+    def close(self):
+        """Release resources such as worker threads held by the reader."""
+        pass
+
 
 class PlateReader(Reader):
     # No API here, just a way to signal that a subclass's metadata class
@@ -189,6 +277,36 @@ class PlateReader(Reader):
     pass
 
 
+class TiffTileReaderMixin(object):
+    """Reader methods for datasets stored as one TIFF file per tile.
+
+    The class must provide `path`, the dataset directory, and a
+    `filename(series, c)` method giving the file name of an image plane within
+    it. Its metadata's `multi_channel_tiles` tells whether all channels of a
+    tile are stored as pages of a single file.
+
+    """
+
+    def read_many(self, series_list, channels):
+        if not self.metadata.multi_channel_tiles:
+            yield from super(TiffTileReaderMixin, self).read_many(
+                series_list, channels
+            )
+            return
+        # All channels are stored in one file, so read them together.
+        channels = list(channels)
+        for series in series_list:
+            path = str(self.path / self.filename(series, channels[0]))
+            img = skimage.io.imread(path, key=channels)
+            shape = (len(channels),) + tuple(self.metadata.tile_size(series))
+            yield img.reshape(shape)
+
+    def read_region(self, series, c, y, x, h, w):
+        path = str(self.path / self.filename(series, c))
+        key = c if self.metadata.multi_channel_tiles else 0
+        return utils.imread_region(path, key, y, x, h, w)
+
+
 class BioformatsMetadata(PlateMetadata):
 
     _pixel_dtypes = {
@@ -198,9 +316,25 @@ class BioformatsMetadata(PlateMetadata):
 
     _ome_dtypes = {v: k for k, v in _pixel_dtypes.items()}
 
-    def __init__(self, path):
+    # Conversion factors to micrometers for the physical OME UnitsLength
+    # values. The micro sign and Greek mu are both seen in the wild. The other
+    # two values, "pixel" and "reference frame", aren't physical lengths.
+    _length_units = {
+        'Ym': 1e30, 'Zm': 1e27, 'Em': 1e24, 'Pm': 1e21, 'Tm': 1e18,
+        'Gm': 1e15, 'Mm': 1e12, 'km': 1e9, 'hm': 1e8, 'dam': 1e7, 'm': 1e6,
+        'dm': 1e5, 'cm': 1e4, 'mm': 1e3, '\u00B5m': 1.0, '\u03BCm': 1.0,
+        'nm': 1e-3, 'pm': 1e-6, 'fm': 1e-9, 'am': 1e-12, 'zm': 1e-15,
+        'ym': 1e-18, '\u00C5': 1e-4,
+        'thou': 25.4, 'li': 25400 / 12, 'in': 25400.0, 'ft': 304800.0,
+        'yd': 914400.0, 'mi': 1609344e3, 'pt': 25400 / 72,
+        'ua': 149597870700e6, 'ly': 9460730472580800e6,
+        'pc': 30856775814913673e6,
+    }
+
+    def __init__(self, path, memo_dir=None):
         super(BioformatsMetadata, self).__init__()
         self.path = path
+        self.memo_dir = memo_dir
         self._init_metadata()
 
     def __getstate__(self):
@@ -214,24 +348,95 @@ class BioformatsMetadata(PlateMetadata):
 
     def _init_metadata(self):
 
+        _init_bioformats()
         factory = ServiceFactory()
         service = jnius.cast(OMEXMLService, factory.getInstance(OMEXMLService))
         metadata = service.createOMEXMLMetadata()
         self._reader = ChannelSeparator()
+        if self.memo_dir is not None:
+            # Save the initialized reader state to a .bfmemo file under
+            # memo_dir, and restore it from there when the same file is opened
+            # again. A minimum elapsed time of 0 memoizes every file.
+            memo_dir = JavaFile(str(self.memo_dir))
+            self._reader = Memoizer(self._reader, 0, memo_dir)
         self._reader.setMetadataStore(metadata)
         self._reader.setId(self.path)
+        if self.memo_dir is not None:
+            # A reader restored from a memo file brings its own metadata store.
+            metadata = jnius.cast(
+                MetadataRetrieve, self._reader.getMetadataStore()
+            )
 
         xml_content = service.getOMEXML(metadata)
         self._metadata = jnius.cast(MetadataRetrieve, metadata)
         self._omexml_root = xml.etree.ElementTree.fromstring(xml_content)
         self.format_name = self._reader.getFormat()
+        self._init_image_metadata()
+
+    def _init_image_metadata(self):
+        # Extract the per-image values we need from the OME-XML in one pass,
+        # rather than making several JNI calls for every tile later on.
+        ns = {'ome': self._omexml_root.tag.split('}')[0].lstrip('{')}
+        self._omexml_ns = ns
+        images = self._omexml_root.findall('ome:Image', ns)
+        n = len(images)
+        self._image_names = [image.get('Name', '') for image in images]
+        self._image_sizes = np.empty((n, 2), dtype=int)
+        self._image_plane_counts = np.empty(n, dtype=int)
+        self._image_pixel_types = []
+        positions = np.zeros((n, 2), dtype=float)
+        position_defined = np.zeros(n, dtype=bool)
+        units = set()
+        for i, image in enumerate(images):
+            pixels = image.find('ome:Pixels', ns)
+            self._image_sizes[i] = pixels.get('SizeY'), pixels.get('SizeX')
+            self._image_pixel_types.append(pixels.get('Type'))
+            # FIXME verify all planes have the same X,Y position.
+            planes = pixels.findall('ome:Plane', ns)
+            self._image_plane_counts[i] = len(planes)
+            if not planes:
+                # Simple file formats don't have planes at all.
+                continue
+            plane = planes[0]
+            y, x = plane.get('PositionY'), plane.get('PositionX')
+            if y is None or x is None:
+                continue
+            y_unit = plane.get('PositionYUnit', 'reference frame')
+            x_unit = plane.get('PositionXUnit', 'reference frame')
+            units.update((y_unit, x_unit))
+            positions[i] = [
+                float(y) * self._length_to_micrometers(y_unit, 1.0),
+                float(x) * self._length_to_micrometers(x_unit, 1.0),
+            ]
+            position_defined[i] = True
+        if not position_defined[:self._num_images].all():
+            warn_data("Stage coordinates undefined; falling back to (0, 0).")
+        if not units.issubset(self._length_units):
+            # The unit is not a physical length, usually "reference frame".
+            # Proceed as if it's actually microns but emit a warning.
+            warn_data(
+                "Stage coordinates' measurement unit is undefined;"
+                " assuming \u03BCm."
+            )
+        # Invert Y so that stage position coordinates and image pixel
+        # coordinates are aligned (most formats seem to work this way).
+        positions *= [-1, 1]
+        self._image_positions_microns = positions
+
+    def _length_to_micrometers(self, unit, default=None):
+        """Return the factor converting `unit` to micrometers.
+
+        Returns `default` if `unit` is not a physical length.
+
+        """
+        return self._length_units.get(unit, default)
 
     @property
     def _num_images(self):
-        count = self._metadata.imageCount
+        count = len(self._image_names)
         # Skip final overview slide in Metamorph Slide Scan data if present.
         if (self.format_name == 'Metamorph STK'
-            and 'overview' in self._metadata.getImageName(count - 1).lower()):
+            and 'overview' in self._image_names[count - 1].lower()):
             count -= 1
         return count
 
@@ -252,7 +457,7 @@ class BioformatsMetadata(PlateMetadata):
         if hasattr(self, '_plate_well_series'):
             return self._plate_well_series
         # FIXME Store slice objects to save resources where possible.
-        series = [
+        self._plate_well_series = [
             [
                 np.array([
                     self._metadata.getWellSampleIndex(p, w, s).value
@@ -262,30 +467,41 @@ class BioformatsMetadata(PlateMetadata):
             ]
             for p, num_wells in enumerate(self.num_wells)
         ]
-        return series
+        return self._plate_well_series
 
     @property
     def pixel_size(self):
+        if hasattr(self, '_pixel_size'):
+            return self._pixel_size
+        pixels = self._omexml_root.find('ome:Image/ome:Pixels', self._omexml_ns)
         values = []
         for dim in ('Y', 'X'):
-            method = getattr(self._metadata, 'getPixelsPhysicalSize%s' % dim)
-            v_units = method(0)
-            if v_units is None:
+            value = pixels.get('PhysicalSize%s' % dim)
+            if value is None:
                 warn_data(
                     "Pixel size undefined; falling back to 1.0 \u03BCm."
                 )
                 value = 1.0
             else:
-                value = v_units.value(UNITS.MICROMETER).doubleValue()
+                unit = pixels.get('PhysicalSize%sUnit' % dim, '\u00B5m')
+                factor = self._length_to_micrometers(unit)
+                if factor is None:
+                    warn_data(
+                        "Pixel size unit '%s' is not a physical length;"
+                        " assuming \u03BCm." % unit
+                    )
+                    factor = 1.0
+                value = float(value) * factor
             values.append(value)
         if values[0] != values[1]:
             raise Exception("Can't handle non-square pixels (%f, %f)"
                             % tuple(values))
-        return values[0]
+        self._pixel_size = values[0]
+        return self._pixel_size
 
     @property
     def pixel_dtype(self):
-        return self._pixel_dtypes[self._metadata.getPixelsType(0).value]
+        return self._pixel_dtypes[self._image_pixel_types[0]]
 
     def plate_name(self, i):
         return self._metadata.getPlateName(i)
@@ -329,90 +545,368 @@ class BioformatsMetadata(PlateMetadata):
         return row_fmt + column_fmt
 
     def tile_position(self, i):
-        planeCount = self._metadata.getPlaneCount(i)
-        values = []
-        for dim in ('Y', 'X'):
-            method = getattr(self._metadata, 'getPlanePosition%s' % dim)
-            # FIXME verify all planes have the same X,Y position.
-            if planeCount > 0:
-                # Returns None if planePositionX/Y not defined.
-                v_units = method(i, 0)
-            else:
-                # Simple file formats don't have planes at all.
-                v_units = None
-            if v_units is None:
-                warn_data(
-                    "Stage coordinates undefined; falling back to (0, 0)."
-                )
-                values = [0.0, 0.0]
-                break
-            else:
-                v = v_units.value(UNITS.MICROMETER)
-                if v is None:
-                    # Conversion failed, which usually happens when the unit is
-                    # "reference frame". Proceed as if it's actually microns but
-                    # emit a warning.
-                    warn_data(
-                        "Stage coordinates' measurement unit is undefined;"
-                        " assuming \u03BCm."
-                    )
-                    v = v_units.value()
-                value = v.doubleValue()
-            values.append(value)
-        position_microns = np.array(values, dtype=float)
-        # Invert Y so that stage position coordinates and image pixel
-        # coordinates are aligned (most formats seem to work this way).
-        position_microns *= [-1, 1]
-        position_pixels = position_microns / self.pixel_size
-        return position_pixels
+        return self._image_positions_microns[i] / self.pixel_size
 
     def tile_size(self, i):
-        values = []
-        for dim in ('Y', 'X'):
-            method = getattr(self._metadata, 'getPixelsSize%s' % dim)
-            v = method(i).value
-            values.append(v)
-        return np.array(values, dtype=int)
+        return self._image_sizes[i]
+
+    def _compute_positions(self):
+        positions = self._image_positions_microns[:self._num_images]
+        return positions / self.pixel_size
+
+    @property
+    def size(self):
+        if not hasattr(self, '_size'):
+            sizes = self._image_sizes[:self._num_images]
+            if (sizes != sizes[0]).any():
+                raise ValueError("Image series must all have the same dimensions")
+            self._size = sizes[0].copy()
+        return self._size
 
 
 class BioformatsReader(PlateReader):
 
-    def __init__(self, path, plate=None, well=None):
+    def __init__(self, path, plate=None, well=None, memo_dir=None):
         self.path = path
-        self.metadata = BioformatsMetadata(self.path)
+        self.metadata = BioformatsMetadata(self.path, memo_dir=memo_dir)
         self.metadata.set_active_plate_well(plate, well)
+        # The Java reader is stateful (setSeries followed by openBytes) so we
+        # must serialize access from multiple threads.
+        self._lock = threading.RLock()
 
     def read(self, series, c):
-        self.metadata._reader.setSeries(self.metadata.active_series[series])
-        index = self.metadata._reader.getIndex(0, c, 0)
-        byte_array = self.metadata._reader.openBytes(index)
+        shape = tuple(self.metadata.tile_size(series))
+        return self._open(series, c, shape)
+
+    def read_region(self, series, c, y, x, h, w):
         dtype = self.metadata.pixel_dtype
-        shape = self.metadata.tile_size(series)
-        img = np.frombuffer(byte_array.tostring(), dtype=dtype).reshape(shape)
-        return img
+        tile_h, tile_w = self.metadata.tile_size(series)
+        y, x = int(y), int(x)
+        h = max(min(int(h), tile_h - y), 0)
+        w = max(min(int(w), tile_w - x), 0)
+        if h == 0 or w == 0:
+            return np.empty((h, w), dtype)
+        return self._open(series, c, (h, w), (x, y, w, h))
+
+    def read_many(self, series_list, channels):
+        dtype = self.metadata.pixel_dtype
+        for series in series_list:
+            shape = tuple(self.metadata.tile_size(series))
+            block = np.empty((len(channels),) + shape, dtype)
+            with self._lock:
+                # Select the series once, then read all planes.
+                self.metadata._reader.setSeries(
+                    int(self.metadata.active_series[series])
+                )
+                for i, c in enumerate(channels):
+                    index = self.metadata._reader.getIndex(0, c, 0)
+                    byte_array = self.metadata._reader.openBytes(index)
+                    np.copyto(block[i], np.frombuffer(
+                        byte_array.tostring(), dtype=dtype
+                    ).reshape(shape))
+            _track_java_thread()
+            yield block
+
+    def _open(self, series, c, shape, region=()):
+        with self._lock:
+            self.metadata._reader.setSeries(
+                int(self.metadata.active_series[series])
+            )
+            index = self.metadata._reader.getIndex(0, c, 0)
+            byte_array = self.metadata._reader.openBytes(index, *region)
+        _track_java_thread()
+        dtype = self.metadata.pixel_dtype
+        return np.frombuffer(byte_array.tostring(), dtype=dtype).reshape(shape)
+
+
+class _JavaThreadDetacher(object):
+    """Detaches the thread that created it from the JVM when finalized."""
+
+    def __del__(self):
+        jnius.detach()
+
+
+_java_threads = threading.local()
+
+
+def _track_java_thread():
+    # Worker threads are attached to the JVM on their first Java call and must
+    # be detached before they exit. Thread-local data is released on the
+    # exiting thread itself, so we keep a detacher there, once per thread.
+    if threading.current_thread() is threading.main_thread():
+        return
+    if not hasattr(_java_threads, 'detacher'):
+        _java_threads.detacher = _JavaThreadDetacher()
+
+
+CacheInfo = collections.namedtuple(
+    'CacheInfo', 'hits misses evictions max_bytes current_bytes'
+)
 
 
 class CachingReader(Reader):
-    """Wraps a reader to provide tile image caching."""
+    """Wraps a reader to provide tile image caching.
+
+    Only images from `channel` are cached. If `max_bytes` is specified, the
+    cache holds at most that many bytes of image data and evicts the least
+    recently used tiles first. Otherwise the cache is unbounded. With a
+    `max_bytes` of 0 nothing is cached and region reads go straight to the
+    wrapped reader, which may be able to avoid reading the full image.
+
+    """
 
-    def __init__(self, reader, channel):
+    def __init__(self, reader, channel, max_bytes=None):
         self.reader = reader
         self.channel = channel
-        self._cache = {}
+        self.max_bytes = max_bytes
+        self._cache = collections.OrderedDict()
+        self._current_bytes = 0
+        self._loading = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
 
     @property
     def metadata(self):
         return self.reader.metadata
 
     def read(self, series, c):
-        if c == self.channel and series in self._cache:
-            img = self._cache[series]
-        else:
-            img = self.reader.read(series, c)
-        if c == self.channel and series not in self._cache:
-            self._cache[series] = img
+        if c != self.channel:
+            return self.reader.read(series, c)
+        with self._lock:
+            img = self._cache.get(series)
+            if img is not None:
+                self._cache.move_to_end(series)
+                self.hits += 1
+                return img
+            # If another thread is already loading this tile, wait for its
+            # result instead of decoding the tile a second time.
+            future = self._loading.get(series)
+            if future is None:
+                future = self._loading[series] = concurrent.futures.Future()
+                self.misses += 1
+                loader = True
+            else:
+                self.hits += 1
+                loader = False
+        if not loader:
+            return future.result()
+        # Don't hold the lock while reading so other threads can still get
+        # cache hits in the meantime.
+        try:
+            img = self._load(series)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[series]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._loading[series]
+            self._insert(series, img)
+        future.set_result(img)
         return img
 
+    def _load(self, series):
+        return self.reader.read(series, self.channel)
+
+    def read_region(self, series, c, y, x, h, w):
+        if c == self.channel:
+            with self._lock:
+                img = self._cache.get(series)
+                if img is not None:
+                    self._cache.move_to_end(series)
+                    self.hits += 1
+                    return img[y:y+h, x:x+w]
+            if self.max_bytes != 0:
+                # We'll want to cache the full image.
+                return self.read(series, c)[y:y+h, x:x+w]
+            with self._lock:
+                self.misses += 1
+        return self.reader.read_region(series, c, y, x, h, w)
+
+    def read_many(self, series_list, channels):
+        return self.reader.read_many(series_list, channels)
+
+    def _insert(self, series, img):
+        if self.max_bytes is not None and img.nbytes > self.max_bytes:
+            return
+        self._cache[series] = img
+        self._current_bytes += img.nbytes
+        while self.max_bytes is not None and self._current_bytes > self.max_bytes:
+            _, old_img = self._cache.popitem(last=False)
+            self._current_bytes -= old_img.nbytes
+            self.evictions += 1
+
+    def prefetch(self, keys):
+        with self._lock:
+            cached = set(self._cache)
+        self.reader.prefetch(
+            (s, c) for s, c in keys if c != self.channel or s not in cached
+        )
+
+    def close(self):
+        self.reader.close()
+
+    def cached_series(self):
+        """Return the set of series whose images are currently cached."""
+        with self._lock:
+            return set(self._cache)
+
+    def release(self, series):
+        """Hint that a tile won't be needed again soon.
+
+        The tile is kept, but it becomes the first candidate for eviction.
+
+        """
+        with self._lock:
+            if series in self._cache:
+                self._cache.move_to_end(series, last=False)
+
+    def cache_info(self):
+        """Return hit, miss and eviction counts and memory usage."""
+        with self._lock:
+            return CacheInfo(
+                self.hits, self.misses, self.evictions, self.max_bytes,
+                self._current_bytes
+            )
+
+
+class WhiteningReader(CachingReader):
+    """Caching reader that returns whitened images for `channel`.
+
+    Each tile is whitened in full with utils.whiten using `sigma` and the
+    float32 result is cached, so overlap regions can be cropped from the
+    filtered tile rather than filtered individually (which also avoids edge
+    artifacts that depend on the crop). Images from other channels are read
+    unmodified and are not cached. With a `max_bytes` of 0, region reads
+    only read and whiten the region plus a margin of the filter's radius,
+    which gives the same result.
+
+    If `spectral` is True the filter is applied in Fourier space (see
+    utils.whiten). The default of None selects it whenever sigma > 0, where
+    it is several times faster than the spatial Laplacian of Gaussian.
+
+    """
+
+    def __init__(self, reader, channel, sigma, max_bytes=None, spectral=None):
+        super(WhiteningReader, self).__init__(reader, channel, max_bytes)
+        self.sigma = sigma
+        if spectral is None:
+            spectral = sigma is not None and sigma > 0
+        self.spectral = spectral
+
+    def read_region(self, series, c, y, x, h, w):
+        if c != self.channel:
+            return self.reader.read_region(series, c, y, x, h, w)
+        if self.max_bytes != 0:
+            # We'll want to cache the full whitened tile.
+            return self.read(series, c)[y:y+h, x:x+w]
+        # Nothing is cached, so only read the region plus enough margin for
+        # the filter to give the same result as whitening the whole tile.
+        with self._lock:
+            self.misses += 1
+        margin = utils.whitening_radius(self.sigma)
+        tile_h, tile_w = self.metadata.tile_size(series)
+        y1, x1 = max(y - margin, 0), max(x - margin, 0)
+        y2, x2 = min(y + h + margin, tile_h), min(x + w + margin, tile_w)
+        img = self.reader.read_region(series, c, y1, x1, y2 - y1, x2 - x1)
+        img = utils.whiten(img, self.sigma, self.spectral)
+        return img[y-y1:y-y1+h, x-x1:x-x1+w]
+
+    def _load(self, series):
+        img = self.reader.read(series, self.channel)
+        return utils.whiten(img, self.sigma, self.spectral)
+
+
+class PrefetchingReader(Reader):
+    """Wraps a reader to load upcoming images on background threads.
+
+    After a call to `prefetch` with the sequence of (series, c) keys that will
+    be read next, up to `depth` of those images are decoded ahead of time by a
+    pool of `workers` threads. Reads of any other images go directly to the
+    wrapped reader.
+
+    """
+
+    def __init__(self, reader, depth=8, workers=2):
+        self.reader = reader
+        self.depth = depth
+        self._executor = concurrent.futures.ThreadPoolExecutor(workers)
+        self._pending = collections.deque()
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    @property
+    def metadata(self):
+        return self.reader.metadata
+
+    def prefetch(self, keys):
+        # Replace the previous schedule, but keep any loads already in progress
+        # for images that are still wanted.
+        keys = list(dict.fromkeys(keys))
+        wanted = set(keys)
+        with self._lock:
+            for key in list(self._futures):
+                if key not in wanted:
+                    self._futures.pop(key).cancel()
+            self._pending = collections.deque(
+                k for k in keys if k not in self._futures
+            )
+            self._fill()
+
+    def read(self, series, c):
+        key = (series, c)
+        with self._lock:
+            future = self._futures.pop(key, None)
+            if future is None and key in self._pending:
+                # The consumer overtook the prefetcher for this image.
+                self._pending.remove(key)
+            self._fill()
+        if future is not None:
+            return future.result()
+        return self.reader.read(series, c)
+
+    def read_region(self, series, c, y, x, h, w):
+        key = (series, c)
+        with self._lock:
+            future = self._futures.pop(key, None)
+            if future is None and key in self._pending:
+                self._pending.remove(key)
+            self._fill()
+        if future is not None:
+            return future.result()[y:y+h, x:x+w]
+        return self.reader.read_region(series, c, y, x, h, w)
+
+    def read_many(self, series_list, channels):
+        # Advance the wrapped reader's generator on a dedicated thread, keeping
+        # up to `depth` blocks in flight.
+        blocks = iter(self.reader.read_many(series_list, channels))
+        with concurrent.futures.ThreadPoolExecutor(1) as executor:
+            futures = collections.deque(
+                executor.submit(next, blocks, None) for _ in range(self.depth)
+            )
+            while True:
+                block = futures.popleft().result()
+                if block is None:
+                    break
+                futures.append(executor.submit(next, blocks, None))
+                yield block
+
+    def _fill(self):
+        while self._pending and len(self._futures) < self.depth:
+            key = self._pending.popleft()
+            self._futures[key] = self._executor.submit(self.reader.read, *key)
+
+    def close(self):
+        """Discard pending prefetches and stop the worker threads."""
+        with self._lock:
+            self._pending.clear()
+            for future in self._futures.values():
+                future.cancel()
+            self._futures.clear()
+        self._executor.shutdown()
+
 
 # TileStatistics = collections.namedtuple(
 #     'TileStatistics',
@@ -428,6 +922,7 @@ def neighbors_graph(aligner):
     is less than the largest tile dimension.
 
     """
+    import networkx as nx
     # FIXME: This should properly test for overlap, possibly via
     # intersection of bounding rectangles.
     if not hasattr(aligner, '_neighbors_graph'):
@@ -442,25 +937,258 @@ def neighbors_graph(aligner):
     return aligner._neighbors_graph
 
 
+def serpentine_order(positions, size):
+    """Return tile indices in serpentine (boustrophedon) order.
+
+    Tiles are grouped into rows, which are swept in alternating directions so
+    consecutive tiles in the ordering are always spatial neighbors. Ties are
+    broken by series number, i.e. file order.
+
+    """
+    n = len(positions)
+    series = np.arange(n)
+    # Start a new row wherever the sorted Y coordinates jump by more than half a
+    # tile height.
+    by_y = np.lexsort((series, positions[:, 1], positions[:, 0]))
+    row_starts = np.diff(positions[by_y, 0]) > size[0] / 2
+    rows = np.empty(n, dtype=int)
+    rows[by_y] = np.concatenate([[0], np.cumsum(row_starts)])
+    x = np.where(rows % 2, -positions[:, 1], positions[:, 1])
+    return np.lexsort((series, x, rows))
+
+
+def _make_executor(jobs):
+    """Return a pool of `jobs` threads for _thread_map, or None if jobs=1."""
+    if jobs > 1:
+        return concurrent.futures.ThreadPoolExecutor(jobs)
+    return None
+
+
+def _thread_map(func, iterable, executor):
+    """Like map(), but spread the calls across the threads of `executor`.
+
+    Results are yielded in the same order as the input. With no executor this
+    is exactly the builtin map.
+
+    """
+    if executor is not None:
+        yield from executor.map(func, iterable)
+    else:
+        yield from map(func, iterable)
+
+
+# Error threshold for an EdgeAligner along with its confidence interval, the
+# negative-sample errors it was estimated from, and the settings that affect it.
+ThresholdProfile = collections.namedtuple(
+    'ThresholdProfile',
+    'errors max_error max_error_interval max_error_confidence'
+    ' false_positive_ratio filter_sigma'
+)
+
+
+def _threshold_profile_path(path):
+    # np.savez appends .npz to paths without it, so do the same on loading.
+    path = pathlib.Path(path)
+    if path.suffix != '.npz':
+        path = path.with_name(path.name + '.npz')
+    return path
+
+
+def save_threshold_profile(profile, path):
+    """Save a ThresholdProfile to an .npz file.
+
+    The .npz extension is added to `path` if it's missing.
+
+    """
+    np.savez(
+        _threshold_profile_path(path), errors=profile.errors,
+        max_error=profile.max_error,
+        max_error_interval=profile.max_error_interval,
+        max_error_confidence=profile.max_error_confidence,
+        false_positive_ratio=profile.false_positive_ratio,
+        filter_sigma=profile.filter_sigma,
+    )
+
+
+def load_threshold_profile(path):
+    """Load a ThresholdProfile saved by save_threshold_profile."""
+    with np.load(_threshold_profile_path(path)) as data:
+        return ThresholdProfile(
+            data['errors'], float(data['max_error']),
+            tuple(data['max_error_interval'].astype(float)),
+            float(data['max_error_confidence']),
+            float(data['false_positive_ratio']), float(data['filter_sigma'])
+        )
+
+
+def _quantile_interval(values, q, confidence):
+    """Return a distribution-free confidence interval for the q-quantile.
+
+    The bounds are order statistics of `values`, chosen using the binomial
+    distribution of the number of values below the quantile. Returns the lower
+    and upper bounds and the confidence actually achieved, which is less than
+    `confidence` if there are too few values.
+
+    """
+    values = np.sort(values)
+    k = len(values)
+    # cdf[j] is the probability that at most j values fall below the quantile.
+    cdf = scipy.special.bdtr(np.arange(k + 1), k, q)
+    alpha = 1 - confidence
+    # The quantile lies between the r-th and s-th smallest values (1-based)
+    # with probability cdf[s - 1] - cdf[r - 1].
+    r = max(np.searchsorted(cdf, alpha / 2, 'right'), 1)
+    s = min(np.searchsorted(cdf, 1 - alpha / 2, 'left') + 1, k)
+    return values[r - 1], values[s - 1], cdf[s - 1] - cdf[r - 1]
+
+
+def _register_grouped(pairs, sigma, upsample, jobs, radius=None,
+                      centers=None, executor=None):
+    """Register a list of (img1, img2) pairs with utils.register_batch.
+
+    Pairs are grouped by image shape so that each group is handled in a single
+    batch. Returns arrays of shifts and errors in the same order as `pairs`.
+    See utils.register_batch for `radius`, `centers` and `executor`.
+
+    """
+    shifts = np.empty((len(pairs), 2))
+    errors = np.empty(len(pairs))
+    if centers is None:
+        centers = np.zeros((len(pairs), 2))
+    centers = np.asarray(centers)
+    groups = collections.defaultdict(list)
+    for i, (img1, _) in enumerate(pairs):
+        groups[img1.shape].append(i)
+    for idx in groups.values():
+        shifts[idx], errors[idx] = utils.register_batch(
+            [pairs[i][0] for i in idx], [pairs[i][1] for i in idx], sigma,
+            upsample, workers=jobs, radius=radius, centers=centers[idx],
+            executor=executor
+        )
+    return shifts, errors
+
+
+class LinearModel(object):
+    """Ordinary least squares affine model mapping points to points.
+
+    This covers the subset of the scikit-learn LinearRegression API we use
+    (fit, predict, coef_ and intercept_) without having to import it.
+
+    """
+
+    def fit(self, X, y):
+        X = np.asarray(X, dtype=float)
+        y = np.asarray(y, dtype=float)
+        X_mean = X.mean(axis=0)
+        y_mean = y.mean(axis=0)
+        # Solve on centered data, as LinearRegression does, which gives the
+        # minimum-norm solution for degenerate inputs (e.g. a single row of
+        # tiles).
+        coef = np.linalg.lstsq(X - X_mean, y - y_mean, rcond=None)[0]
+        self.coef_ = coef.T
+        self.intercept_ = y_mean - X_mean @ self.coef_.T
+        return self
+
+    def predict(self, X):
+        return np.asarray(X, dtype=float) @ self.coef_.T + self.intercept_
+
+
 class EdgeAligner(object):
 
+    # Maximum number of edges or error sampling strips to register together in
+    # one batch.
+    batch_size = 64
+    # When learning the shift prior, the number of accepted edges needed before
+    # the search radius is narrowed, and the factor by which the radius must
+    # exceed the 99th percentile of their shifts.
+    prior_min_edges = 20
+    prior_margin = 2.0
+    # Larger overlap windows are skipped once an edge's error is below this
+    # fraction of max_error.
+    window_exit_factor = 0.5
+    # Negative sampling for the error threshold stops once a confidence
+    # interval at this level for the threshold percentile is narrower than
+    # threshold_tolerance times the threshold.
+    threshold_confidence = 0.95
+    threshold_tolerance = 0.1
+
     def __init__(
         self, reader, channel=0, max_shift=15, false_positive_ratio=0.01,
-        filter_sigma=0.0, do_make_thumbnail=True, verbose=False
+        filter_sigma=0.0, do_make_thumbnail=True, verbose=False, jobs=1,
+        cache_size=None, learn_shift_prior=False, threshold_profile=None
     ):
         self.channel = channel
+        # Unit is bytes. None means the tile caches are unbounded.
+        self.cache_size = cache_size
+        self.filter_sigma = filter_sigma
+        # Raw alignment channel tiles are cached for the thumbnail, the
+        # alignment and the mosaic. Alignment works on whitened tiles, which
+        # are filtered once and cached in whitened_reader. The cache sizes are
+        # set by _set_cache_sizes.
         self.reader = CachingReader(reader, self.channel)
+        self.whitened_reader = WhiteningReader(
+            self.reader, self.channel, self.filter_sigma
+        )
+        self._set_cache_sizes()
         self.verbose = verbose
         # Unit is micrometers.
         self.max_shift = max_shift
         self.max_shift_pixels = self.max_shift / self.metadata.pixel_size
+        # Registration only searches for shifts within this radius (per axis,
+        # in pixels). If learn_shift_prior is set, it's narrowed during
+        # register_all to fit the shifts of the edges aligned so far.
+        self.shift_radius = np.repeat(self.max_shift_pixels, 2)
+        self.learn_shift_prior = learn_shift_prior
         self.false_positive_ratio = false_positive_ratio
-        self.filter_sigma = filter_sigma
+        # If a ThresholdProfile is given, compute_threshold uses it instead of
+        # sampling errors. Otherwise it's set to the computed profile.
+        self.threshold_profile = threshold_profile
         self.do_make_thumbnail = do_make_thumbnail
+        # Number of worker threads for edge registration. The same threads are
+        # used for the life of the aligner, so each one attaches to the JVM
+        # only once.
+        self.jobs = jobs
+        self._executor = _make_executor(jobs)
         self._cache = {}
+        # Shape of the overlap window whose shift was used, for each edge.
+        self.edge_windows = {}
 
     neighbors_graph = neighbors_graph
 
+    def _set_cache_sizes(self):
+        """Divide cache_size between the raw and whitened tile caches.
+
+        The caches share cache_size, split so that they hold the same number
+        of tiles. Without a cache_size, raw tiles are cached without limit,
+        but the whitened cache only holds three times as many tiles as
+        register_all needs at once, so that tiles aren't all kept twice.
+
+        """
+        # Whitened tiles are float32, so they take more space than raw ones.
+        raw_itemsize = np.dtype(self.metadata.pixel_dtype).itemsize
+        whitened_itemsize = np.dtype(np.float32).itemsize
+        if self.cache_size is None:
+            edges, finished_tiles = self.schedule_edges(
+                list(self.neighbors_graph.edges)
+            )
+            live = set()
+            max_live = 0
+            for edge, finished in zip(edges, finished_tiles):
+                live.update(edge)
+                max_live = max(max_live, len(live))
+                live.difference_update(finished)
+            tile_bytes = np.prod(self.metadata.size) * whitened_itemsize
+            raw_size = None
+            whitened_size = int(max(3 * max_live, 2) * tile_bytes)
+        else:
+            raw_size = (
+                self.cache_size * raw_itemsize
+                // (raw_itemsize + whitened_itemsize)
+            )
+            whitened_size = self.cache_size - raw_size
+        self.reader.max_bytes = raw_size
+        self.whitened_reader.max_bytes = whitened_size
+
     def run(self):
         self.make_thumbnail()
         self.check_overlaps()
@@ -497,12 +1225,18 @@ class EdgeAligner(object):
         # distribution of error scores for many known non-overlapping image
         # regions and take a certain percentile as the maximum allowable error.
         # The percentile becomes our accepted false-positive ratio.
+        if self.threshold_profile is not None:
+            self._apply_threshold_profile(self.threshold_profile)
+            return
         edges = self.neighbors_graph.edges
         num_tiles = self.metadata.num_images
         # If not enough tiles overlap to matter, skip this whole thing.
         if len(edges) <= 1:
             self.errors_negative_sampled = np.empty(0)
             self.max_error = np.inf
+            self.max_error_interval = (np.inf, np.inf)
+            self.max_error_confidence = 0.0
+            self.threshold_profile = self._make_threshold_profile()
             return
         widths = np.array([
             self.intersection(t1, t2).shape.min()
@@ -515,74 +1249,367 @@ class EdgeAligner(object):
         # Reduce permutation count for small datasets -- there are fewer
         # possible truly distinct strips with fewer tiles. The calculation here
         # is just a heuristic, not rigorously derived.
+        # This is the most samples we'll take, but we stop as soon as the
+        # threshold estimate is precise enough.
         n = 1000 if num_distant_pairs > 8 else (num_distant_pairs + 1) * 10
-        pairs = np.empty((n, 2), dtype=int)
-        offsets = np.empty((n, 2), dtype=int)
-        # Generate n random non-overlapping image strips. Strips are always
-        # horizontal, across the entire image width.
-        max_tries = 100
-        for i in range(n):
-            # Limit tries to avoid infinite loop in pathological cases.
-            for current_try in range(max_tries):
-                t1, t2 = np.random.randint(self.metadata.num_images, size=2)
-                o1, o2 = np.random.randint(max_offset, size=2)
-                # Check for non-overlapping strips and abort the retry loop.
-                if t1 != t2 and (t1, t2) not in edges:
-                    # Different, non-neighboring tiles -- always OK.
-                    break
-                elif t1 == t2 and abs(o1 - o2) > w:
-                    # Same tile OK if strips don't overlap within the image.
-                    break
-                elif (t1, t2) in edges:
-                    # Neighbors OK if either strip is entirely outside the
-                    # expected overlap region (based on nominal positions).
-                    its = self.intersection(t1, t2, np.repeat(w, 2))
-                    ioff1, ioff2 = its.offsets[:, 0]
-                    if (
-                        its.shape[0] > its.shape[1]
-                        or o1 < ioff1 - w or o1 > ioff1 + w
-                        or o2 < ioff2 - w or o2 > ioff2 + w
-                    ):
-                        break
-            else:
-                # Retries exhausted. This should be very rare.
-                warn_data(
-                    "Could not find non-overlapping strips in {max_tries} tries"
-                )
-            pairs[i] = t1, t2
-            offsets[i] = o1, o2
-        errors = np.empty(n)
-        for i, ((t1, t2), (offset1, offset2)) in enumerate(zip(pairs, offsets)):
-            if self.verbose and (i % 10 == 9 or i == n - 1):
+        overlap_table = self._overlap_table(w)
+        rank = self._tile_rank()
+        bands = self._sample_bands()
+        band_order = []
+        errors = np.empty(0)
+        # All strips have the same shape, so we sample, read and register them
+        # in fixed-size batches.
+        while len(errors) < n:
+            m = min(self.batch_size, n - len(errors))
+            # With a bounded cache, each batch pairs the tiles of two bands.
+            # The bands are taken in random order so that stopping early still
+            # samples from across the whole dataset, and each batch shares one
+            # band with the batch before it.
+            batch_bands = None
+            if bands is not None:
+                while len(band_order) < 2:
+                    permutation = list(np.random.permutation(len(bands)))
+                    if band_order and permutation[0] == band_order[-1]:
+                        permutation.append(permutation.pop(0))
+                    band_order.extend(permutation)
+                batch_bands = (bands[band_order[0]], bands[band_order[1]])
+                band_order.pop(0)
+            # Favor strips from tiles that are already cached.
+            pairs, offsets = self._sample_strips(
+                m, w, max_offset, overlap_table,
+                self.whitened_reader.cached_series(), batch_bands
+            )
+            # Visit the strips in serpentine order of their tiles so that a
+            # bounded tile cache doesn't have to re-read tiles over and over.
+            pair_ranks = np.sort(rank[pairs], axis=1)
+            sample_order = np.lexsort((pair_ranks[:, 1], pair_ranks[:, 0]))
+            pairs = pairs[sample_order]
+            offsets = offsets[sample_order]
+            self.whitened_reader.prefetch((t, self.channel) for t in pairs.flat)
+            strips = list(_thread_map(
+                lambda args: self._read_strips(*args, w),
+                zip(pairs, offsets), self._executor,
+            ))
+            # Search the same radius as the edge registration so the errors
+            # are comparable.
+            _, batch_errors = _register_grouped(
+                strips, None, 1, self.jobs, self.max_shift_pixels,
+                executor=self._executor
+            )
+            errors = np.append(errors, batch_errors)
+            max_error = np.percentile(errors, self.false_positive_ratio * 100)
+            lower, upper, confidence = _quantile_interval(
+                errors, self.false_positive_ratio, self.threshold_confidence
+            )
+            if self.verbose:
                 sys.stdout.write(
-                    '\r    quantifying alignment error %d/%d' % (i + 1, n)
+                    '\r    quantifying alignment error %d/%d'
+                    % (len(errors), n)
                 )
                 sys.stdout.flush()
-            img1 = self.reader.read(t1, self.channel)[offset1:offset1+w, :]
-            img2 = self.reader.read(t2, self.channel)[offset2:offset2+w, :]
-            _, errors[i] = utils.register(img1, img2, self.filter_sigma, upsample=1)
+            if (
+                confidence >= self.threshold_confidence
+                and upper - lower <= self.threshold_tolerance * abs(max_error)
+            ):
+                break
         if self.verbose:
             print()
+            print(
+                '    error threshold %.3f, %.1f%% confidence interval'
+                ' [%.3f, %.3f] from %d samples'
+                % (max_error, confidence * 100, lower, upper, len(errors))
+            )
         self.errors_negative_sampled = errors
-        self.max_error = np.percentile(errors, self.false_positive_ratio * 100)
+        self.max_error = max_error
+        # Bounds of the confidence interval for max_error, and the confidence
+        # level actually achieved (which may fall short of
+        # threshold_confidence if the sampling limit was reached first).
+        self.max_error_interval = (lower, upper)
+        self.max_error_confidence = confidence
+        self.threshold_profile = self._make_threshold_profile()
+
+    def _make_threshold_profile(self):
+        return ThresholdProfile(
+            self.errors_negative_sampled, self.max_error,
+            self.max_error_interval, self.max_error_confidence,
+            self.false_positive_ratio, self.filter_sigma
+        )
+
+    def _apply_threshold_profile(self, profile):
+        if profile.filter_sigma != self.filter_sigma:
+            warn_data(
+                "Error threshold profile was computed with filter sigma {}"
+                " rather than {}".format(profile.filter_sigma, self.filter_sigma)
+            )
+        self.errors_negative_sampled = profile.errors
+        if (
+            profile.false_positive_ratio == self.false_positive_ratio
+            or len(profile.errors) == 0
+        ):
+            self.max_error = profile.max_error
+            self.max_error_interval = profile.max_error_interval
+            self.max_error_confidence = profile.max_error_confidence
+        else:
+            # The sampled errors still let us pick a different percentile.
+            self.max_error = np.percentile(
+                profile.errors, self.false_positive_ratio * 100
+            )
+            lower, upper, confidence = _quantile_interval(
+                profile.errors, self.false_positive_ratio,
+                self.threshold_confidence
+            )
+            self.max_error_interval = (lower, upper)
+            self.max_error_confidence = confidence
+        if self.verbose:
+            print('    error threshold %.3f from profile' % self.max_error)
+
+    def _overlap_table(self, w):
+        """Return neighbor pair codes and their overlap strip row offsets.
+
+        The tile pairs of all edges are encoded as integers (sorted, for
+        lookups) along with the row offsets of their expected overlap regions
+        in each tile, based on nominal positions and a strip height of `w`, and
+        whether the overlap region is taller than it is wide.
+
+        """
+        num_tiles = self.metadata.num_images
+        edges = np.array(sorted(
+            tuple(sorted(e)) for e in self.neighbors_graph.edges
+        ))
+        codes = edges[:, 0] * num_tiles + edges[:, 1]
+        overlap_offsets = np.empty((len(edges), 2))
+        vertical = np.empty(len(edges), dtype=bool)
+        for i, (t1, t2) in enumerate(edges):
+            its = self.intersection(t1, t2, np.repeat(w, 2))
+            overlap_offsets[i] = its.offsets[:, 0]
+            vertical[i] = its.shape[0] > its.shape[1]
+        return codes, overlap_offsets, vertical
+
+    def _sample_bands(self):
+        """Return the groups of tiles that error sampling batches draw from.
+
+        With a bounded tile cache the tiles are split into bands of
+        consecutive tiles in serpentine order, small enough that two of them
+        stay cached while a batch is read. Otherwise returns None.
+
+        """
+        num_tiles = self.metadata.num_images
+        capacity = self._cache_capacity()
+        if capacity is None or capacity >= num_tiles:
+            return None
+        # Bands end up between band_size and 2 * band_size - 1 tiles long.
+        band_size = max(capacity // 4, 1)
+        order = serpentine_order(self.metadata.positions, self.metadata.size)
+        return np.array_split(order, max(num_tiles // band_size, 2))
+
+    def _sample_strips(self, n, w, max_offset, overlap_table, preferred=(),
+                       bands=None, max_tries=100):
+        """Return tile pairs and row offsets for n random non-overlapping strips.
+
+        Strips are always horizontal, across the entire image width, and `w`
+        rows high. Candidates for all of the strips are drawn and checked in
+        bulk, and only the rejected ones are redrawn. If any `preferred` tiles
+        are given, twice as many candidates are drawn and those with the most
+        preferred tiles are used first. If a pair of tile arrays is given as
+        `bands`, the first tile of each pair is drawn from the first band and
+        the second from the other.
+
+        """
+        num_tiles = self.metadata.num_images
+        codes, overlap_offsets, vertical = overlap_table
+        preferred = np.array(sorted(preferred), dtype=int)
+        oversample = 2 if len(preferred) else 1
+        pairs = np.empty((n, 2), dtype=int)
+        offsets = np.empty((n, 2), dtype=int)
+        remaining = np.arange(n)
+        # Limit tries to avoid infinite loop in pathological cases.
+        for _ in range(max_tries):
+            size = (len(remaining) * oversample, 2)
+            if bands is None:
+                t = np.random.randint(num_tiles, size=size)
+            else:
+                t = np.stack([
+                    band[np.random.randint(len(band), size=size[0])]
+                    for band in bands
+                ], axis=1)
+            o = np.random.randint(max_offset, size=size)
+            same = t[:, 0] == t[:, 1]
+            code = t.min(axis=1) * num_tiles + t.max(axis=1)
+            idx = np.searchsorted(codes, code).clip(max=len(codes) - 1)
+            neighbor = codes[idx] == code
+            # Different, non-neighboring tiles -- always OK.
+            ok = ~same & ~neighbor
+            # Same tile OK if strips don't overlap within the image.
+            ok |= same & (np.abs(o[:, 0] - o[:, 1]) > w)
+            # Neighbors OK if either strip is entirely outside the expected
+            # overlap region.
+            ioff = overlap_offsets[idx]
+            swapped = t[:, 0] > t[:, 1]
+            ioff[swapped] = ioff[swapped, ::-1]
+            outside = ((o < ioff - w) | (o > ioff + w)).any(axis=1)
+            ok |= neighbor & (vertical[idx] | outside)
+            valid = np.flatnonzero(ok)
+            if len(preferred):
+                score = np.isin(t[valid], preferred).sum(axis=1)
+                valid = valid[np.argsort(-score, kind='stable')]
+            valid = valid[:len(remaining)]
+            pairs[remaining[:len(valid)]] = t[valid]
+            offsets[remaining[:len(valid)]] = o[valid]
+            remaining = remaining[len(valid):]
+            if len(remaining) == 0:
+                break
+        else:
+            # Retries exhausted. This should be very rare. Use the last
+            # candidates anyway.
+            pairs[remaining] = t[:len(remaining)]
+            offsets[remaining] = o[:len(remaining)]
+            warn_data(
+                "Could not find non-overlapping strips for {} samples in {}"
+                " tries".format(len(remaining), max_tries)
+            )
+        return pairs, offsets
+
+    def _read_strips(self, tiles, offsets, height):
+        """Return whitened full-width strips of `height` rows from two tiles."""
+        width = self.metadata.size[1]
+        return tuple(
+            self.whitened_reader.read_region(
+                t, self.channel, offset, 0, height, width
+            )
+            for t, offset in zip(tiles, offsets)
+        )
 
     def register_all(self):
         n = self.neighbors_graph.size()
-        for i, (t1, t2) in enumerate(self.neighbors_graph.edges, 1):
+        keys = [tuple(sorted(e)) for e in self.neighbors_graph.edges]
+        # Each edge is registered independently, so we can spread the work
+        # across threads (the heavy numpy/scipy code releases the GIL). The
+        # edges are processed in an order that keeps the working set of tiles
+        # small, and tiles are released from the cache after their last use.
+        pending, finished_tiles = self.schedule_edges(
+            [k for k in keys if k not in self._cache]
+        )
+        self.whitened_reader.prefetch(
+            (t, self.channel) for edge in pending for t in edge
+        )
+        results = {}
+        for start, end in self._batch_bounds(pending):
+            batch = pending[start:end]
+            results.update(zip(batch, self._compute_pairs(batch)))
+            for tiles in finished_tiles[start:end]:
+                for t in tiles:
+                    self.whitened_reader.release(t)
+            if self.learn_shift_prior:
+                self._update_shift_radius(results.values())
             if self.verbose:
-                sys.stdout.write('\r    aligning edge %d/%d' % (i, n))
+                sys.stdout.write('\r    aligning edge %d/%d' % (end, n))
                 sys.stdout.flush()
-            self.register_pair(t1, t2)
         if self.verbose:
             print()
+            for name, reader in (
+                ('raw', self.reader), ('whitened', self.whitened_reader)
+            ):
+                info = reader.cache_info()
+                print(
+                    '    %s tile cache: %d hits, %d misses, %d evictions,'
+                    ' %.1f MB used' % (
+                        name, info.hits, info.misses, info.evictions,
+                        info.current_bytes / 1024 ** 2
+                    )
+                )
+        # Store results in edge order so the cache contents and ordering are
+        # independent of the scheduling.
+        for key in keys:
+            if key in results:
+                self._cache[key] = results[key]
         self.all_errors = np.array([x[1] for x in self._cache.values()])
         # Set error values above the threshold to infinity.
         for k, v in self._cache.items():
             if v[1] > self.max_error or any(np.abs(v[0]) > self.max_shift_pixels):
                 self._cache[k] = (v[0], np.inf)
 
+    def _update_shift_radius(self, results):
+        """Narrow the search radius to fit the shifts of the accepted edges."""
+        shifts = np.array([
+            shift for shift, error in results
+            if error <= self.max_error
+            and all(np.abs(shift) <= self.max_shift_pixels)
+        ])
+        if len(shifts) < self.prior_min_edges:
+            return
+        bound = np.percentile(np.abs(shifts), 99, axis=0)
+        # Allow at least a couple of pixels for the subpixel refinement.
+        self.shift_radius = np.clip(
+            bound * self.prior_margin, 2, self.max_shift_pixels
+        )
+
+    def schedule_edges(self, edges):
+        """Order edges for locality of tile access.
+
+        Edges are sorted by the later of their two tiles in a serpentine sweep
+        over the tile positions, so only about one row of tiles needs to stay
+        cached at a time. Returns the sorted edges and, for each edge, a list of
+        the tiles that are not needed by any subsequent edge.
+
+        """
+        rank = self._tile_rank()
+        edges = sorted(
+            edges, key=lambda e: (max(rank[e[0]], rank[e[1]]),
+                                  min(rank[e[0]], rank[e[1]]))
+        )
+        last_use = {}
+        for i, edge in enumerate(edges):
+            for t in edge:
+                last_use[t] = i
+        finished_tiles = [[] for _ in edges]
+        for t, i in last_use.items():
+            finished_tiles[i].append(t)
+        return edges, finished_tiles
+
+    def _batch_bounds(self, edges):
+        """Return (start, end) indices that split `edges` into batches.
+
+        A batch holds at most batch_size edges. If the tile cache is bounded, a
+        batch also touches at most a third as many distinct tiles as the cache
+        can hold, so its tiles stay cached through all of its window sizes
+        along with the tiles that later batches will reuse.
+
+        """
+        capacity = self._cache_capacity()
+        max_tiles = None if capacity is None else max(capacity // 3, 2)
+        bounds = []
+        start = 0
+        tiles = set()
+        for i, edge in enumerate(edges):
+            tiles.update(edge)
+            if i > start and (
+                i - start == self.batch_size
+                or (max_tiles is not None and len(tiles) > max_tiles)
+            ):
+                bounds.append((start, i))
+                start = i
+                tiles = set(edge)
+        if start < len(edges):
+            bounds.append((start, len(edges)))
+        return bounds
+
+    def _cache_capacity(self):
+        """Return the number of whitened tiles the cache holds, or None."""
+        max_bytes = self.whitened_reader.max_bytes
+        if max_bytes is None:
+            return None
+        tile_bytes = np.prod(self.metadata.size) * np.dtype(np.float32).itemsize
+        return int(max_bytes // tile_bytes)
+
+    def _tile_rank(self):
+        order = serpentine_order(self.metadata.positions, self.metadata.size)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        return rank
+
     def build_spanning_tree(self):
         # Note that this may be disconnected, so it's technically a forest.
+        import networkx as nx
         g = nx.Graph()
         g.add_nodes_from(self.neighbors_graph)
         g.add_weighted_edges_from(
@@ -601,6 +1628,7 @@ class EdgeAligner(object):
         self.spanning_tree = spanning_tree
 
     def calculate_positions(self):
+        import networkx as nx
         shifts = {}
         for c in nx.connected_components(self.spanning_tree):
             cc = self.spanning_tree.subgraph(c)
@@ -620,13 +1648,14 @@ class EdgeAligner(object):
             raise NotImplementedError("No images")
 
     def fit_model(self):
+        import networkx as nx
         components = sorted(
             nx.connected_components(self.spanning_tree),
             key=len, reverse=True
         )
         # Fit LR model on positions of largest connected component.
         cc0 = list(components[0])
-        self.lr = sklearn.linear_model.LinearRegression()
+        self.lr = LinearModel()
         self.lr.fit(self.metadata.positions[cc0], self.positions[cc0])
         # Fix up degenerate transform matrix (e.g. when we have only one tile).
         if (self.lr.coef_ == 0).all():
@@ -652,43 +1681,125 @@ class EdgeAligner(object):
         try:
             shift, error = self._cache[key]
         except KeyError:
-            # We test a series of increasing overlap window sizes to help avoid
-            # missing alignments when the stage position error is large relative
-            # to the tile overlap. Simply using a large overlap in all cases
-            # limits the maximum achievable correlation thus increasing the
-            # error metric, leading to worse overall results. The window size
-            # starts at the nominal size and doubles until it's at least 10% of
-            # the tile size. If the nominal overlap is already 10% or greater,
-            # we only use that one size.
-            smin = self.intersection(key[0], key[1]).shape
-            smax = np.round(self.metadata.size * 0.1)
-            sizes = [smin]
-            while any(sizes[-1] < smax):
-                sizes.append(sizes[-1] * 2)
-            results = [self._register(key[0], key[1], s) for s in sizes]
-            # Use the shift from the window size that gave the lowest error.
-            shift, _ = min(results, key=lambda r: r[1])
-            # Extract the images from the nominal overlap window but with the
-            # shift applied to the second tile's position, and compute the error
-            # metric on these images. This should be even lower than the error
-            # computed above.
-            _, o1, o2 = self.overlap(key[0], key[1], shift=shift)
-            error = utils.nccw(o1, o2, self.filter_sigma)
+            shift, error = self._compute_pair(key)
             self._cache[key] = (shift, error)
         if t1 > t2:
             shift = -shift
         # Return copy of shift to prevent corruption of cached values.
         return shift.copy(), error
 
-    def _register(self, t1, t2, min_size=0):
-        its, img1, img2 = self.overlap(t1, t2, min_size)
+    def _compute_pair(self, key):
+        """Register the tiles in the (sorted) edge `key`, bypassing the cache."""
+        return self._compute_pairs([key])[0]
+
+    def _compute_pairs(self, keys):
+        """Register the tiles in each (sorted) edge in `keys`.
+
+        This bypasses the cache. The overlap windows of all the edges are
+        registered together in batches of the same shape, one window size at a
+        time. An edge moves on to its next larger window only while its error
+        is inconclusive, and otherwise keeps the shift from the window size
+        that gave the lowest error.
+
+        """
+        sizes = list(_thread_map(self._window_sizes, keys, self._executor))
+        # Without a threshold (including before compute_threshold has run)
+        # every window size is tested.
+        max_error = getattr(self, 'max_error', np.inf)
+        if np.isfinite(max_error):
+            exit_error = max_error * self.window_exit_factor
+        else:
+            exit_error = -np.inf
+        best_errors = np.full(len(keys), np.inf)
+        best_shifts = [None] * len(keys)
+        pending = list(range(len(keys)))
+        level = 0
+        while pending:
+            windows = list(_thread_map(
+                lambda i: self._window(keys[i], sizes[i][level]),
+                pending, self._executor
+            ))
+            # The padding is added to the shifts found below, so the search is
+            # centered on -padding.
+            shifts, errors = _register_grouped(
+                [(img1, img2) for _, img1, img2 in windows], None, 10,
+                self.jobs, self.shift_radius,
+                [-padding for padding, _, _ in windows], self._executor
+            )
+            still_pending = []
+            for i, (padding, img1, _), shift, error in zip(
+                pending, windows, shifts, errors
+            ):
+                if best_shifts[i] is None or error < best_errors[i]:
+                    best_errors[i] = error
+                    best_shifts[i] = shift + padding
+                    self.edge_windows[keys[i]] = img1.shape
+                if error > exit_error and level + 1 < len(sizes[i]):
+                    still_pending.append(i)
+            pending = still_pending
+            level += 1
+        # Extract the images from the nominal overlap window but with the shift
+        # applied to the second tile's position, and compute the error metric on
+        # these images. This should be even lower than the error computed above.
+        errors = _thread_map(
+            lambda args: self._shifted_error(*args),
+            zip(keys, best_shifts), self._executor
+        )
+        return list(zip(best_shifts, errors))
+
+    def _window_sizes(self, key):
+        """Return the increasing overlap window sizes to test for an edge."""
+        t1, t2 = key
+        # We test a series of increasing overlap window sizes to help avoid
+        # missing alignments when the stage position error is large relative
+        # to the tile overlap. Simply using a large overlap in all cases limits
+        # the maximum achievable correlation thus increasing the error metric,
+        # leading to worse overall results. The window size starts at the
+        # nominal size and doubles until it's at least 10% of the tile size. If
+        # the nominal overlap is already 10% or greater, we only use that one
+        # size. Shifts outside the search radius are rejected anyway, so the
+        # window is never grown by more than the radius on either side.
+        smin = self.intersection(t1, t2).shape
+        limit = smin + 2 * np.ceil(self.shift_radius).astype(int)
+        smax = np.minimum(np.round(self.metadata.size * 0.1), limit)
+        sizes = [smin]
+        while any(sizes[-1] < smax):
+            sizes.append(np.minimum(sizes[-1] * 2, limit))
+        return sizes
+
+    def _window(self, key, size):
+        """Return (padding, img1, img2) for an edge's overlap window."""
+        its, img1, img2 = self._fft_overlap(*key, size)
+        return self._padding(*key, its), img1, img2
+
+    def _fft_overlap(self, t1, t2, min_size=0):
+        """Return the whitened overlap grown to an FFT-friendly shape."""
+        # The extra rows and columns are taken from the tiles just like any
+        # other min_size growth, so they are accounted for in its.padding.
+        # Snapping to a few fast lengths also lets more windows share a shape
+        # and thus be registered in the same batch.
+        its = self.intersection(t1, t2, min_size)
+        min_size = utils.fft_shape(its.shape)
+        return self.overlap(t1, t2, min_size, whitened=True)
+
+    def _padding(self, t1, t2, its):
         # Account for padding, flipping the sign depending on the direction
         # between the tiles.
         p1, p2 = self.metadata.positions[[t1, t2]]
         sx = 1 if p1[1] >= p2[1] else -1
         sy = 1 if p1[0] >= p2[0] else -1
-        padding = its.padding * [sy, sx]
-        shift, error = utils.register(img1, img2, self.filter_sigma)
+        return its.padding * [sy, sx]
+
+    def _shifted_error(self, key, shift):
+        _, o1, o2 = self.overlap(*key, shift=shift, whitened=True)
+        return utils.nccw(o1, o2, None)
+
+    def _register(self, t1, t2, min_size=0):
+        its, img1, img2 = self._fft_overlap(t1, t2, min_size)
+        padding = self._padding(t1, t2, its)
+        shift, error = utils.register(
+            img1, img2, None, radius=self.shift_radius, center=-padding
+        )
         shift += padding
         return shift, error
 
@@ -699,14 +1810,17 @@ class EdgeAligner(object):
         corners2 = corners1 + self.metadata.size
         return Intersection(corners1, corners2, min_size)
 
-    def crop(self, tile, offset, shape):
-        img = self.reader.read(series=tile, c=self.channel)
-        return utils.crop(img, offset, shape)
+    def crop(self, tile, offset, shape, whitened=False):
+        # Note that this only crops to the nearest whole-pixel offset.
+        y, x = offset.round().astype(int)
+        h, w = shape
+        reader = self.whitened_reader if whitened else self.reader
+        return reader.read_region(tile, self.channel, y, x, h, w)
 
-    def overlap(self, t1, t2, min_size=0, shift=None):
+    def overlap(self, t1, t2, min_size=0, shift=None, whitened=False):
         its = self.intersection(t1, t2, min_size, shift)
-        img1 = self.crop(t1, its.offsets[0], its.shape)
-        img2 = self.crop(t2, its.offsets[1], its.shape)
+        img1 = self.crop(t1, its.offsets[0], its.shape, whitened)
+        img2 = self.crop(t2, its.offsets[1], its.shape, whitened)
         return its, img1, img2
 
     @property
@@ -725,10 +1839,10 @@ class EdgeAligner(object):
         return np.ceil(max_dimensions).astype(int)
 
     def debug(self, t1, t2, min_size=0):
+        import matplotlib.pyplot as plt
         shift, _ = self._register(t1, t2, min_size)
-        its, o1, o2 = self.overlap(t1, t2, min_size)
-        w1 = utils.whiten(o1, self.filter_sigma)
-        w2 = utils.whiten(o2, self.filter_sigma)
+        its, w1, w2 = self._fft_overlap(t1, t2, min_size)
+        _, o1, o2 = self.overlap(t1, t2, its.shape)
         corr = scipy.fft.fftshift(np.abs(scipy.fft.ifft2(
             scipy.fft.fft2(w1) * scipy.fft.fft2(w2).conj()
         )))
@@ -766,8 +1880,11 @@ class EdgeAligner(object):
 
 class LayerAligner(object):
 
+    # Maximum number of tiles to register together in one batch.
+    batch_size = 64
+
     def __init__(self, reader, reference_aligner, channel=None, max_shift=15,
-                 filter_sigma=0.0, verbose=False):
+                 filter_sigma=0.0, verbose=False, jobs=1):
         self.reader = reader
         self.reference_aligner = reference_aligner
         if channel is None:
@@ -777,7 +1894,24 @@ class LayerAligner(object):
         self.max_shift = max_shift
         self.max_shift_pixels = self.max_shift / self.metadata.pixel_size
         self.filter_sigma = filter_sigma
+        # Each of our tiles is read just once, so there's no point in caching
+        # the whitened images. The reference aligner's whitened tile cache is
+        # reused if its tiles were filtered the same way.
+        self.whitened_reader = WhiteningReader(
+            self.reader, self.channel, self.filter_sigma, 0
+        )
+        if reference_aligner.filter_sigma == self.filter_sigma:
+            self.reference_whitened_reader = reference_aligner.whitened_reader
+        else:
+            self.reference_whitened_reader = WhiteningReader(
+                reference_aligner.reader, reference_aligner.channel,
+                self.filter_sigma, 0
+            )
         self.verbose = verbose
+        # Number of worker threads for tile registration, kept for the life of
+        # the aligner as in EdgeAligner.
+        self.jobs = jobs
+        self._executor = _make_executor(jobs)
         # FIXME Still a bit muddled here on the use of metadata positions vs.
         # corrected positions from the reference aligner. We probably want to
         # use metadata positions to find the cycle-to-cycle tile
@@ -813,13 +1947,36 @@ class LayerAligner(object):
         n = self.metadata.num_images
         self.shifts = np.empty((n, 2))
         self.errors = np.empty(n)
-        for i in range(n):
+        self.reader.prefetch((t, self.channel) for t in range(n))
+        self.reference_whitened_reader.prefetch(
+            (t, self.reference_aligner.channel) for t in self.reference_idx
+        )
+        for start in range(0, n, self.batch_size):
+            tiles = range(start, min(start + self.batch_size, n))
+            overlaps = list(_thread_map(
+                lambda t: self.overlap(t, whitened=True), tiles,
+                self._executor
+            ))
+            self.shifts[tiles] = 0
+            self.errors[tiles] = np.inf
+            # Tiles without any overlap keep the values set above.
+            valid = [
+                (t, ov) for t, ov in zip(tiles, overlaps)
+                if not np.any(np.array(ov[0].shape) == 0)
+            ]
+            if valid:
+                valid_tiles = [t for t, _ in valid]
+                shifts, errors = _register_grouped(
+                    [(ref_img, img) for _, (_, ref_img, img) in valid],
+                    None, 10, self.jobs, executor=self._executor
+                )
+                self.shifts[valid_tiles] = shifts
+                self.errors[valid_tiles] = errors
             if self.verbose:
-                sys.stdout.write("\r    aligning tile %d/%d" % (i + 1, n))
+                sys.stdout.write(
+                    "\r    aligning tile %d/%d" % (tiles[-1] + 1, n)
+                )
                 sys.stdout.flush()
-            shift, error = self.register(i)
-            self.shifts[i] = shift
-            self.errors[i] = error
         if self.verbose:
             print()
 
@@ -872,10 +2029,10 @@ class LayerAligner(object):
 
     def register(self, t):
         """Return relative shift between images and the alignment error."""
-        its, ref_img, img = self.overlap(t)
+        its, ref_img, img = self.overlap(t, whitened=True)
         if np.any(np.array(its.shape) == 0):
             return (0, 0), np.inf
-        shift, error = utils.register(ref_img, img, self.filter_sigma)
+        shift, error = utils.register(ref_img, img, None)
         # We don't use padding and thus can skip the math to account for it.
         assert (its.padding == 0).all(), "Unexpected non-zero padding"
         return shift, error
@@ -885,18 +2042,29 @@ class LayerAligner(object):
                               self.corrected_nominal_positions[t]])
         corners2 = corners1 + self.reader.metadata.size
         its = Intersection(corners1, corners2)
-        its.shape = its.shape // 32 * 32
+        # Crop to an FFT-friendly shape, but skip overlaps too small to yield
+        # a reliable registration.
+        its.shape = np.where(
+            its.shape < 32, 0, utils.fft_shape(its.shape, crop=True)
+        )
         return its
 
-    def overlap(self, t):
+    def overlap(self, t, whitened=False):
         its = self.intersection(t)
         ref_t = self.reference_idx[t]
-        img1 = self.reference_aligner.reader.read(
-            series=ref_t, c=self.reference_aligner.channel
+        h, w = its.shape
+        y1, x1 = its.offsets[0].round().astype(int)
+        y2, x2 = its.offsets[1].round().astype(int)
+        if whitened:
+            ref_reader = self.reference_whitened_reader
+            reader = self.whitened_reader
+        else:
+            ref_reader = self.reference_aligner.reader
+            reader = self.reader
+        ov1 = ref_reader.read_region(
+            ref_t, self.reference_aligner.channel, y1, x1, h, w
         )
-        img2 = self.reader.read(series=t, c=self.channel)
-        ov1 = utils.crop(img1, its.offsets[0], its.shape)
-        ov2 = utils.crop(img2, its.offsets[1], its.shape)
+        ov2 = reader.read_region(t, self.channel, y2, x2, h, w)
         return its, ov1, ov2
 
     @property
@@ -904,10 +2072,10 @@ class LayerAligner(object):
         return self.reader.metadata
 
     def debug(self, t):
+        import matplotlib.pyplot as plt
         shift, _ = self.register(t)
         its, o1, o2 = self.overlap(t)
-        w1 = utils.whiten(o1, self.filter_sigma)
-        w2 = utils.whiten(o2, self.filter_sigma)
+        _, w1, w2 = self.overlap(t, whitened=True)
         corr = scipy.fft.fftshift(np.abs(scipy.fft.ifft2(
             scipy.fft.fft2(w1) * scipy.fft.fft2(w2).conj()
         )))
@@ -956,7 +2124,7 @@ class Mosaic(object):
     def __init__(
             self, aligner, shape, filename_format, channels=None,
             ffp_path=None, dfp_path=None, combined=False, tile_size=None,
-            first=False, verbose=False
+            first=False, verbose=False, tile_major=False
     ):
         self.aligner = aligner
         self.shape = tuple(shape)
@@ -968,6 +2136,9 @@ class Mosaic(object):
         self.dtype = aligner.metadata.pixel_dtype
         self._load_correction_profiles(dfp_path, ffp_path)
         self.verbose = verbose
+        # In tile-major mode each tile is read only once for all channels, at
+        # the cost of holding all of the channel mosaics in memory at once.
+        self.tile_major = tile_major
 
     def _sanitize_channels(self, channels):
         all_channels = range(self.aligner.metadata.num_channels)
@@ -1046,47 +2217,27 @@ class Mosaic(object):
             self.do_correction = True
 
     def run(self, mode='write', debug=False):
+        import networkx as nx
         if mode not in ('write', 'return'):
             raise ValueError('Invalid mode')
-        num_tiles = len(self.aligner.positions)
-        all_images = []
+        node_colors = None
         if debug:
             node_colors = nx.greedy_color(self.aligner.neighbors_graph)
             num_colors = max(node_colors.values()) + 1
             if num_colors > 3:
                 raise ValueError("neighbor graph requires more than 3 colors")
-        for ci, channel in enumerate(self.channels):
-            if self.verbose:
-                print('    Channel %d:' % channel)
-            if not debug:
-                mosaic_image = np.zeros(self.shape, self.dtype)
-            else:
-                mosaic_image = np.zeros(self.shape + (3,), np.float32)
-            for tile, position in enumerate(self.aligner.positions):
-                if self.verbose:
-                    sys.stdout.write('\r        merging tile %d/%d'
-                                     % (tile + 1, num_tiles))
-                    sys.stdout.flush()
-                tile_image = self.aligner.reader.read(c=channel, series=tile)
-                tile_image = self.correct_illumination(tile_image, channel)
-                if debug:
-                    color_channel = node_colors[tile]
-                    rgb_image = np.zeros(tile_image.shape + (3,),
-                                         tile_image.dtype)
-                    rgb_image[:,:,color_channel] = tile_image
-                    tile_image = rgb_image
-                func = utils.pastefunc_blend if not debug else np.add
-                utils.paste(mosaic_image, tile_image, position, func=func)
-            if debug:
-                np.clip(mosaic_image, 0, 1, out=mosaic_image)
-                w = int(1e6)
-                mi_flat = mosaic_image.reshape(-1, 3)
-                for p in np.arange(0, mi_flat.shape[0], w, dtype=int):
-                    mi_flat[p:p+w] = skimage.exposure.adjust_gamma(
-                        mi_flat[p:p+w], 1/2.2
-                    )
-            if self.verbose:
-                print()
+        if self.tile_major:
+            mosaic_images = self.assemble_tile_major(node_colors)
+        else:
+            # Lazily assemble one channel at a time to limit memory use.
+            mosaic_images = (
+                self.assemble_channel(channel, node_colors)
+                for channel in self.channels
+            )
+        all_images = []
+        for ci, (channel, mosaic_image) in enumerate(
+            zip(self.channels, mosaic_images)
+        ):
             if mode == 'write':
                 filename = self.filename_format.format(channel=channel)
                 kwargs = {}
@@ -1119,6 +2270,95 @@ class Mosaic(object):
         if mode == 'return':
             return all_images
 
+    def assemble_channel(self, channel, node_colors=None):
+        """Assemble and return the mosaic image for one channel."""
+        num_tiles = len(self.aligner.positions)
+        if self.verbose:
+            print('    Channel %d:' % channel)
+        self.aligner.reader.prefetch(
+            (tile, channel) for tile in range(num_tiles)
+        )
+        mosaic_image = self._new_mosaic_image(node_colors)
+        for tile, position in enumerate(self.aligner.positions):
+            if self.verbose:
+                sys.stdout.write('\r        merging tile %d/%d'
+                                 % (tile + 1, num_tiles))
+                sys.stdout.flush()
+            tile_image = self.aligner.reader.read(c=channel, series=tile)
+            self._paste_tile(
+                mosaic_image, tile_image, tile, channel, position, node_colors
+            )
+        if node_colors is not None:
+            self._adjust_debug_gamma(mosaic_image)
+        if self.verbose:
+            print()
+        return mosaic_image
+
+    def assemble_tile_major(self, node_colors=None):
+        """Assemble and return the mosaic images for all channels at once.
+
+        Each tile is read just once for all channels with Reader.read_many.
+
+        """
+        num_tiles = len(self.aligner.positions)
+        channels = list(self.channels)
+        if self.verbose:
+            print('    Channels %s:' % ', '.join(str(c) for c in channels))
+        mosaic_images = [
+            self._new_mosaic_image(node_colors) for _ in channels
+        ]
+        blocks = self.aligner.reader.read_many(range(num_tiles), channels)
+        for tile, (position, block) in enumerate(
+            zip(self.aligner.positions, blocks)
+        ):
+            if self.verbose:
+                sys.stdout.write('\r        merging tile %d/%d'
+                                 % (tile + 1, num_tiles))
+                sys.stdout.flush()
+            for mosaic_image, channel, tile_image in zip(
+                mosaic_images, channels, block
+            ):
+                self._paste_tile(
+                    mosaic_image, tile_image, tile, channel, position,
+                    node_colors
+                )
+        if node_colors is not None:
+            for mosaic_image in mosaic_images:
+                self._adjust_debug_gamma(mosaic_image)
+        if self.verbose:
+            print()
+        return mosaic_images
+
+    def _new_mosaic_image(self, node_colors):
+        if node_colors is None:
+            return np.zeros(self.shape, self.dtype)
+        else:
+            return np.zeros(self.shape + (3,), np.float32)
+
+    def _paste_tile(
+        self, mosaic_image, tile_image, tile, channel, position, node_colors
+    ):
+        tile_image = self.correct_illumination(tile_image, channel)
+        if node_colors is not None:
+            color_channel = node_colors[tile]
+            rgb_image = np.zeros(tile_image.shape + (3,), tile_image.dtype)
+            rgb_image[:,:,color_channel] = tile_image
+            tile_image = rgb_image
+            func = np.add
+        else:
+            func = utils.pastefunc_blend
+        utils.paste(mosaic_image, tile_image, position, func=func)
+
+    def _adjust_debug_gamma(self, mosaic_image):
+        import skimage.exposure
+        np.clip(mosaic_image, 0, 1, out=mosaic_image)
+        w = int(1e6)
+        mi_flat = mosaic_image.reshape(-1, 3)
+        for p in np.arange(0, mi_flat.shape[0], w, dtype=int):
+            mi_flat[p:p+w] = skimage.exposure.adjust_gamma(
+                mi_flat[p:p+w], 1/2.2
+            )
+
     def correct_illumination(self, img, channel):
         if self.do_correction:
             img = skimage.util.img_as_float(img, force_copy=True)
@@ -1131,6 +2371,7 @@ class Mosaic(object):
 def build_pyramid(
         path, num_channels, shape, dtype, pixel_size, tile_size, verbose=False
 ):
+    import skimage.transform
     max_level = 0
     shapes = [shape]
     while any(s > tile_size for s in shape):
@@ -1244,6 +2485,9 @@ def warn_data(message):
 
 
 def plot_edge_shifts(aligner, img=None, bounds=True):
+    import networkx as nx
+    import matplotlib.pyplot as plt
+    import matplotlib.patches as mpatches
     fig = plt.figure()
     ax = plt.gca()
     draw_mosaic_image(ax, aligner, img)
@@ -1273,6 +2517,8 @@ def plot_edge_quality(
     aligner, img=None, show_tree=True, pos='metadata', use_mi=True,
     nx_kwargs=None
 ):
+    import networkx as nx
+    import matplotlib.pyplot as plt
     if pos == 'metadata':
         centers = aligner.metadata.centers - aligner.metadata.origin
     elif pos == 'aligner':
@@ -1330,6 +2576,7 @@ def plot_edge_quality(
 
 
 def plot_edge_scatter(aligner, annotate=True):
+    import matplotlib.pyplot as plt
     import seaborn as sns
     xdata = aligner.all_errors
     ydata = np.clip(
@@ -1357,6 +2604,9 @@ def plot_edge_scatter(aligner, annotate=True):
 
 
 def plot_layer_shifts(aligner, img=None):
+    import networkx as nx
+    import matplotlib.pyplot as plt
+    import matplotlib.patches as mpatches
     fig = plt.figure()
     ax = plt.gca()
     draw_mosaic_image(ax, aligner, img)
@@ -49,6 +49,12 @@ def main(argv=sys.argv):
         '-m', '--maximum-shift', type=float, default=15, metavar='SHIFT',
         help='maximum allowed per-tile corrective shift in microns'
     )
+    parser.add_argument(
+        '--learn-shift-prior', default=False, action='store_true',
+        help=('narrow the shift search radius below the maximum shift to fit'
+              ' the shifts of the first aligned tile edges, allowing smaller'
+              ' overlap windows for the rest')
+    )
     parser.add_argument(
         '--filter-sigma', type=float, default=0.0, metavar='SIGMA',
         help=('width in pixels of Gaussian filter to apply to images before'
@@ -66,6 +72,12 @@ def main(argv=sys.argv):
         '--pyramid', default=False, action='store_true',
         help='write output as a single pyramidal TIFF'
     )
+    parser.add_argument(
+        '--tile-major', default=False, action='store_true',
+        help=('read each tile once for all output channels when assembling'
+              ' the mosaics, which holds all of a cycle\'s channel mosaics in'
+              ' memory at once')
+    )
     # Implement default-value logic ourselves so we can detect when the user
     # has explicitly set a value.
     tile_size_default = 1024
@@ -88,6 +100,42 @@ def main(argv=sys.argv):
         '--plates', default=False, action='store_true',
         help='enable plate mode for HTS data'
     )
+    parser.add_argument(
+        '--plate-threshold', default=False, action='store_true',
+        help=('in plate mode, compute the alignment error threshold once per'
+              ' plate and reuse it for the remaining wells')
+    )
+    parser.add_argument(
+        '--threshold-profile', metavar='PATH',
+        help=('use the alignment error threshold saved in PATH instead of'
+              ' computing it')
+    )
+    parser.add_argument(
+        '--save-threshold-profile', metavar='PATH',
+        help=('save the alignment error threshold to PATH for use with'
+              ' --threshold-profile; a .npz extension is added if missing;'
+              ' in plate mode the first computed threshold is saved')
+    )
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=1, metavar='N',
+        help=('use N worker threads for tile registration; default is 1')
+    )
+    parser.add_argument(
+        '--prefetch', type=int, default=0, metavar='TILES',
+        help=('read up to TILES images ahead in background threads; default'
+              ' is 0 which disables prefetching')
+    )
+    parser.add_argument(
+        '--cache-size', type=float, default=None, metavar='MB',
+        help=('limit the cache of alignment channel tiles to MB megabytes,'
+              ' shared by the raw tiles and their filtered copies (4 bytes per'
+              ' pixel); default is unlimited')
+    )
+    parser.add_argument(
+        '--memo-dir', metavar='DIR',
+        help=('cache Bio-Formats reader state for each input file in DIR so'
+              ' that later runs on the same files open them faster')
+    )
     parser.add_argument(
         '-q', '--quiet', dest='quiet', default=False, action='store_true',
         help='suppress progress display'
@@ -119,6 +167,18 @@ def main(argv=sys.argv):
     if args.tile_size and not args.pyramid:
         print_error("--tile-size can only be used with --pyramid")
         return 1
+    if args.jobs < 1:
+        print_error("--jobs must be at least 1")
+        return 1
+    if args.prefetch < 0:
+        print_error("--prefetch must not be negative")
+        return 1
+    if args.cache_size is not None and args.cache_size <= 0:
+        print_error("--cache-size must be positive")
+        return 1
+    if args.memo_dir is not None and not pathlib.Path(args.memo_dir).is_dir():
+        print_error("Memo directory '{}' does not exist".format(args.memo_dir))
+        return 1
     if args.tile_size is None:
         # Implement default value logic as mentioned in argparser setup above.
         args.tile_size = tile_size_default
@@ -145,11 +205,41 @@ def main(argv=sys.argv):
         if len(dfp_paths) == 1:
             dfp_paths = dfp_paths * len(filepaths)
 
+    if args.plate_threshold and not args.plates:
+        print_error("--plate-threshold can only be used with --plates")
+        return 1
+    threshold_profile = None
+    if args.threshold_profile is not None:
+        try:
+            threshold_profile = reg.load_threshold_profile(
+                args.threshold_profile
+            )
+        except (OSError, KeyError, ValueError) as e:
+            print_error(
+                "Could not load threshold profile '{}': {}".format(
+                    args.threshold_profile, e
+                )
+            )
+            return 1
+
+    reader_args = {}
+    reader_args['prefetch'] = args.prefetch
+    if args.memo_dir is not None:
+        reader_args['memo_dir'] = args.memo_dir
+
     aligner_args = {}
     aligner_args['channel'] = args.align_channel
     aligner_args['verbose'] = not args.quiet
     aligner_args['max_shift'] = args.maximum_shift
     aligner_args['filter_sigma'] = args.filter_sigma
+    aligner_args['jobs'] = args.jobs
+
+    edge_aligner_args = {}
+    if args.cache_size is not None:
+        edge_aligner_args['cache_size'] = int(args.cache_size * 1024 ** 2)
+    edge_aligner_args['learn_shift_prior'] = args.learn_shift_prior
+    if threshold_profile is not None:
+        edge_aligner_args['threshold_profile'] = threshold_profile
 
     mosaic_args = {}
     if args.output_channels:
@@ -158,21 +248,29 @@ def main(argv=sys.argv):
         mosaic_args['tile_size'] = args.tile_size
     if args.quiet is False:
         mosaic_args['verbose'] = True
+    if args.tile_major:
+        mosaic_args['tile_major'] = True
 
     try:
         if args.plates:
             return process_plates(
                 filepaths, output_path, args.filename_format, args.flip_x,
-                args.flip_y, ffp_paths, dfp_paths, aligner_args, mosaic_args,
-                args.pyramid, args.quiet
+                args.flip_y, ffp_paths, dfp_paths, reader_args, aligner_args,
+                edge_aligner_args, mosaic_args, args.pyramid, args.quiet,
+                args.plate_threshold, args.save_threshold_profile
             )
         else:
             mosaic_path_format = str(output_path / args.filename_format)
-            return process_single(
+            profile = process_single(
                 filepaths, mosaic_path_format, args.flip_x, args.flip_y,
-                ffp_paths, dfp_paths, aligner_args, mosaic_args, args.pyramid,
-                args.quiet
+                ffp_paths, dfp_paths, reader_args, aligner_args,
+                edge_aligner_args, mosaic_args, args.pyramid, args.quiet
             )
+            if args.save_threshold_profile is not None:
+                reg.save_threshold_profile(
+                    profile, args.save_threshold_profile
+                )
+            return 0
     except ProcessingError as e:
         print_error(str(e))
         return 1
@@ -180,8 +278,10 @@ def main(argv=sys.argv):
 
 def process_single(
     filepaths, mosaic_path_format, flip_x, flip_y, ffp_paths, dfp_paths,
-    aligner_args, mosaic_args, pyramid, quiet, plate_well=None
+    reader_args, aligner_args, edge_aligner_args, mosaic_args, pyramid, quiet,
+    plate_well=None, readers=None
 ):
+    """Process one dataset and return its error threshold profile."""
 
     output_path_0 = format_cycle(mosaic_path_format, 0)
     if pyramid:
@@ -198,10 +298,11 @@ def process_single(
 
     if not quiet:
         print('Cycle 0:')
-        print('    reading %s' % filepaths[0])
-    reader = build_reader(filepaths[0], plate_well=plate_well)
-    process_axis_flip(reader, flip_x, flip_y)
+    reader = open_cycle_reader(
+        0, filepaths, readers, plate_well, reader_args, flip_x, flip_y, quiet
+    )
     ea_args = aligner_args.copy()
+    ea_args.update(edge_aligner_args)
     if len(filepaths) == 1:
         ea_args['do_make_thumbnail'] = False
     edge_aligner = reg.EdgeAligner(reader, **ea_args)
@@ -219,12 +320,13 @@ def process_single(
     mosaic.run()
     num_channels += len(mosaic.channels)
 
-    for cycle, filepath in enumerate(filepaths[1:], 1):
+    for cycle in range(1, len(filepaths)):
         if not quiet:
             print('Cycle %d:' % cycle)
-            print('    reading %s' % filepath)
-        reader = build_reader(filepath, plate_well=plate_well)
-        process_axis_flip(reader, flip_x, flip_y)
+        reader = open_cycle_reader(
+            cycle, filepaths, readers, plate_well, reader_args, flip_x, flip_y,
+            quiet
+        )
         layer_aligner = reg.LayerAligner(reader, edge_aligner, **aligner_args)
         layer_aligner.run()
         mosaic_args_final = mosaic_args.copy()
@@ -238,6 +340,12 @@ def process_single(
         )
         mosaic.run()
         num_channels += len(mosaic.channels)
+        if readers is None:
+            reader.close()
+
+    if readers is None:
+        # Cycle 0 is read by every LayerAligner, so it's closed last.
+        edge_aligner.reader.close()
 
     if pyramid:
         print("Building pyramid")
@@ -246,16 +354,32 @@ def process_single(
             reader.metadata.pixel_size, mosaic_args['tile_size'], not quiet
         )
 
-    return 0
+    return edge_aligner.threshold_profile
 
 
 def process_plates(
     filepaths, output_path, filename_format, flip_x, flip_y, ffp_paths,
-    dfp_paths, aligner_args, mosaic_args, pyramid, quiet
+    dfp_paths, reader_args, aligner_args, edge_aligner_args, mosaic_args,
+    pyramid, quiet, plate_threshold=False, save_threshold_profile=None
 ):
 
-    temp_reader = build_reader(filepaths[0])
-    metadata = temp_reader.metadata
+    # Open each cycle's file just once and switch between wells later, since
+    # initializing a reader can be very expensive.
+    readers = []
+    for filepath in filepaths:
+        if not quiet:
+            print('Reading %s' % filepath)
+        reader = build_reader(filepath, **reader_args)
+        if not isinstance(reader.metadata, reg.PlateMetadata):
+            raise ProcessingError(
+                "The %s reader does not support plate/well processing"
+                % type(reader).__name__
+            )
+        process_axis_flip(reader, flip_x, flip_y)
+        readers.append(reader)
+    if not quiet:
+        print()
+    metadata = readers[0].metadata
     if metadata.num_plates == 0:
         # FIXME raise ProcessingError here instead?
         print("Dataset does not contain plate information.")
@@ -263,25 +387,66 @@ def process_plates(
 
     for p, plate_name in enumerate(metadata.plate_names):
         print("Plate {} ({})\n==========\n".format(p, plate_name))
+        plate_edge_aligner_args = edge_aligner_args.copy()
         for w, well_name in enumerate(metadata.well_names[p]):
             print("Well {}\n-----".format(well_name))
             if len(metadata.plate_well_series[p][w]) > 0:
                 well_path = output_path / plate_name / well_name
                 well_path.mkdir(parents=True, exist_ok=True)
                 mosaic_path_format = str(well_path / filename_format)
-                process_single(
+                profile = process_single(
                     filepaths, mosaic_path_format, flip_x, flip_y,
-                    ffp_paths, dfp_paths, aligner_args, mosaic_args, pyramid,
-                    quiet, plate_well=(p, w)
+                    ffp_paths, dfp_paths, reader_args, aligner_args,
+                    plate_edge_aligner_args, mosaic_args, pyramid, quiet,
+                    plate_well=(p, w), readers=readers
                 )
+                # Wells with too few tiles to sample any errors don't give a
+                # usable threshold.
+                if len(profile.errors) > 0:
+                    if (
+                        plate_threshold
+                        and 'threshold_profile' not in plate_edge_aligner_args
+                    ):
+                        plate_edge_aligner_args['threshold_profile'] = profile
+                    if save_threshold_profile is not None:
+                        reg.save_threshold_profile(
+                            profile, save_threshold_profile
+                        )
+                        save_threshold_profile = None
             else:
                 print("Skipping -- No images found.")
             print()
         print()
 
+    for reader in readers:
+        reader.close()
     return 0
 
 
+def open_cycle_reader(
+    cycle, filepaths, readers, plate_well, reader_args, flip_x, flip_y, quiet
+):
+    """Return the reader for a cycle, switching it to plate_well.
+
+    If `readers` is None a new reader is built for the cycle's file, otherwise
+    the already-open reader from that list is reused.
+
+    """
+    if readers is None:
+        if not quiet:
+            print('    reading %s' % filepaths[cycle])
+        reader = build_reader(
+            filepaths[cycle], plate_well=plate_well, **reader_args
+        )
+        process_axis_flip(reader, flip_x, flip_y)
+    else:
+        reader = readers[cycle]
+        # Drop any images prefetched for the previous well.
+        reader.prefetch(())
+        reader.metadata.set_active_plate_well(*plate_well)
+    return reader
+
+
 def format_cycle(f, cycle):
     return f.format(cycle=cycle, channel='{channel}')
 
@@ -293,6 +458,11 @@ def process_axis_flip(reader, flip_x, flip_y):
     sx = -1 if flip_x else 1
     sy = -1 if flip_y else 1
     metadata._positions *= [sy, sx]
+    if isinstance(metadata, reg.PlateMetadata):
+        # Rebuild the active well's snapshot from the flipped positions.
+        metadata.set_active_plate_well(
+            metadata.active_plate, metadata.active_well
+        )
 
 
 readers = {
@@ -304,7 +474,7 @@ readers = {
 
 # This is a short-term hack to provide a way to specify alternate reader
 # classes and pass specific args to them.
-def build_reader(path, plate_well=None):
+def build_reader(path, plate_well=None, prefetch=0, memo_dir=None):
     # Default to BioformatsReader if name not specified.
     reader_class = BioformatsReader
     kwargs = {}
@@ -325,7 +495,11 @@ def build_reader(path, plate_well=None):
                 % reader_class.__name__
             )
         kwargs.update(plate=plate_well[0], well=plate_well[1])
+    if memo_dir is not None and issubclass(reader_class, BioformatsReader):
+        kwargs.update(memo_dir=memo_dir)
     reader = reader_class(path, **kwargs)
+    if prefetch:
+        reader = reg.PrefetchingReader(reader, depth=prefetch)
     return reader
 
 
@@ -2,17 +2,17 @@ import sys
 import pathlib
 import numpy as np
 from . import utils
-from skimage.transform import rescale
-from skimage.feature import register_translation
 
 
 def make_thumbnail(reader, channel=0, scale=0.05):
+    from skimage.transform import rescale
     metadata = reader.metadata
     positions = metadata.positions - metadata.origin
     coordinate_max = (positions + metadata.size).max(axis=0)
     mshape = ((coordinate_max + 1) * scale).astype(int)
     mosaic = np.zeros(mshape, dtype=np.uint16)
     total = reader.metadata.num_images
+    reader.prefetch((i, channel) for i in range(total))
     for i in range(total):
         sys.stdout.write("\r    assembling thumbnail %d/%d" % (i + 1, total))
         sys.stdout.flush()
@@ -27,6 +27,7 @@ def make_thumbnail(reader, channel=0, scale=0.05):
 
 
 def calculate_image_offset(img1, img2, upsample_factor=1):
+    from skimage.feature import register_translation
     ref = utils.whiten(img1, 0)
     test = utils.whiten(img2, 0)
     shift, error, _ = register_translation(ref, test, upsample_factor)
@@ -1,6 +1,6 @@
+import functools
 import itertools
 import warnings
-import skimage.feature
 import skimage.io
 import skimage.restoration.uft
 import skimage.morphology
@@ -14,8 +14,20 @@ import numpy as np
 # Pre-calculate the Laplacian operator kernel. We'll always be using 2D images.
 _laplace_kernel = skimage.restoration.uft.laplacian(2, (3, 3))[1]
 
-def whiten(img, sigma):
+def whiten(img, sigma, spectral=False):
+    """Apply a Laplacian (sigma=0) or Laplacian of Gaussian filter to img.
+
+    A sigma of None means img is already whitened, and it's returned as-is.
+    With `spectral`, the filter is applied as a multiplication in Fourier space
+    which is much faster than the spatial filter for sigma > 0 and gives the
+    same result to within float32 rounding.
+
+    """
+    if sigma is None:
+        return img
     img = skimage.img_as_float32(img)
+    if spectral:
+        return _whiten_spectral(img, sigma)
     if sigma == 0:
         output = scipy.ndimage.convolve(img, _laplace_kernel)
     else:
@@ -23,25 +35,193 @@ def whiten(img, sigma):
     return output
 
 
-def register(img1, img2, sigma, upsample=10):
-    img1w = whiten(img1, sigma)
-    img2w = whiten(img2, sigma)
-    img1_f = scipy.fft.fft2(img1w)
-    img2_f = scipy.fft.fft2(img2w)
-    shift, _error, _phasediff = skimage.feature.register_translation(
-        img1_f, img2_f, upsample, 'fourier'
+def whiten_stack(imgs, sigma, spectral=False):
+    """Whiten each image in a (n, y, x) stack, like whiten."""
+    if sigma is None:
+        return imgs
+    imgs = skimage.img_as_float32(imgs)
+    if spectral:
+        return _whiten_spectral(imgs, sigma)
+    if sigma == 0:
+        output = scipy.ndimage.convolve(imgs, _laplace_kernel[np.newaxis])
+    else:
+        # Sum the second derivatives along the two image axes only, exactly as
+        # gaussian_laplace does for a single image.
+        output = np.zeros_like(imgs)
+        for axis in (1, 2):
+            order = [0, 0, 0]
+            order[axis] = 2
+            output += scipy.ndimage.gaussian_filter(
+                imgs, (0, sigma, sigma), order
+            )
+    return output
+
+
+def _whiten_spectral(imgs, sigma):
+    # Filter the last two axes of imgs in Fourier space. Padding by reflection
+    # out to the kernel radius makes the circular convolution match the
+    # spatial filters' default 'reflect' boundary mode exactly.
+    radius = whitening_radius(sigma)
+    pad = [(0, 0)] * (imgs.ndim - 2) + [(radius, radius)] * 2
+    padded = np.pad(imgs, pad, mode='symmetric')
+    shape = tuple(fft_shape(padded.shape[-2:]))
+    spectrum = scipy.fft.rfft2(padded, s=shape)
+    spectrum *= _whitening_transfer(shape, sigma)
+    output = scipy.fft.irfft2(spectrum, s=shape)
+    h, w = imgs.shape[-2:]
+    # Copy the result out of the padded array, so that cached tiles don't
+    # keep the larger padded buffer alive.
+    return np.ascontiguousarray(
+        output[..., radius:radius + h, radius:radius + w]
+    )
+
+
+def whitening_radius(sigma):
+    """Return the radius of the whitening filter's kernel for `sigma`.
+
+    Whitening a crop that extends this far beyond a region of an image (or
+    to the image's edge) gives the same result within the region as
+    whitening the whole image.
+
+    """
+    if sigma is None:
+        return 0
+    # Same truncation as scipy.ndimage.gaussian_laplace's default.
+    return 1 if sigma == 0 else int(4.0 * sigma + 0.5)
+
+
+def _whitening_kernels(sigma):
+    # Return the 1-D smoothing and second-derivative kernels whose separable
+    # combination gives the whitening filter, along with their sample points.
+    radius = whitening_radius(sigma)
+    x = np.arange(-radius, radius + 1)
+    if sigma == 0:
+        # The discrete Laplacian kernel (negated, to match _laplace_kernel).
+        return x, np.array([0.0, 1.0, 0.0]), np.array([-1.0, 2.0, -1.0])
+    # Sampled Gaussian and its second derivative, exactly as computed by
+    # scipy.ndimage.gaussian_filter1d.
+    smooth = np.exp(-0.5 / sigma ** 2 * x ** 2)
+    smooth /= smooth.sum()
+    second = smooth * (x ** 2 / sigma ** 4 - 1 / sigma ** 2)
+    return x, smooth, second
+
+
+@functools.lru_cache(maxsize=16)
+def _whitening_transfer(shape, sigma):
+    """Return the whitening filter's frequency response in rfft2 layout."""
+    # The kernels are symmetric so their DFTs are real cosine sums.
+    x, smooth, second = _whitening_kernels(sigma)
+    fy = np.fft.fftfreq(shape[0])
+    fx = np.fft.rfftfreq(shape[1])
+    cos_y = np.cos(2 * np.pi * np.outer(x, fy))
+    cos_x = np.cos(2 * np.pi * np.outer(x, fx))
+    transfer = (
+        np.outer(second @ cos_y, smooth @ cos_x)
+        + np.outer(smooth @ cos_y, second @ cos_x)
+    )
+    transfer = transfer.astype(np.float32)
+    transfer.flags.writeable = False
+    return transfer
+
+
+def fft_shape(shape, crop=False):
+    """Return the nearest FFT-friendly shape that is at least `shape`.
+
+    With `crop`, the shape is instead reduced to the nearest FFT-friendly
+    shape that is at most `shape`.
+
+    """
+    if crop:
+        # scipy.fft.prev_fast_len is too recent to rely on, but fast lengths
+        # are dense enough that a simple downward search is cheap.
+        fast = []
+        for n in shape:
+            n = int(n)
+            while n > 1 and scipy.fft.next_fast_len(n, True) != n:
+                n -= 1
+            fast.append(n)
+    else:
+        fast = [scipy.fft.next_fast_len(max(int(n), 1), True) for n in shape]
+    return np.array(fast)
+
+
+def register(img1, img2, sigma, upsample=10, spectral=False, radius=None,
+             center=(0, 0)):
+    """Return the shift of img2 relative to img1 and the alignment error.
+
+    The cross-correlation peak is located just as
+    skimage.feature.register_translation does (with upsampled subpixel
+    refinement) but using real FFTs, which only compute half of the spectrum.
+    If `radius` is given (a scalar or one value per axis), only shifts within
+    that distance of `center` are considered.
+
+    """
+    img1w = whiten(img1, sigma, spectral)
+    img2w = whiten(img2, sigma, spectral)
+    product = scipy.fft.rfft2(img1w) * scipy.fft.rfft2(img2w).conj()
+    correlation = scipy.fft.irfft2(product, s=img1w.shape)
+    shift, fixed = _correlation_peak(
+        product, correlation, upsample, radius, center
     )
+    return _resolve_shift(img1w, img2w, shift, fixed)
+
+
+def register_batch(imgs1, imgs2, sigma, upsample=10, workers=1,
+                   spectral=False, radius=None, centers=None, executor=None):
+    """Register corresponding pairs of images from two stacks.
+
+    All images must have the same shape. This gives the same results as
+    calling register on each pair, but whitens and transforms each stack in a
+    single call, with the FFTs spread over `workers` threads. The peak search
+    and quadrant resolution for each pair run on the threads of `executor` if
+    one is given. Returns an (n, 2) array of shifts and an array of n errors.
+    See whiten for `spectral`, and register for `radius`. The search centers
+    may be given per pair as an (n, 2) array, and default to zero.
+
+    """
+    imgs1w = whiten_stack(np.asarray(imgs1), sigma, spectral)
+    imgs2w = whiten_stack(np.asarray(imgs2), sigma, spectral)
+    n = len(imgs1w)
+    shifts = np.empty((n, 2))
+    errors = np.empty(n)
+    if n == 0:
+        return shifts, errors
+    shape = imgs1w.shape[1:]
+    products = scipy.fft.rfft2(imgs1w, workers=workers)
+    products *= scipy.fft.rfft2(imgs2w, workers=workers).conj()
+    correlations = scipy.fft.irfft2(products, s=shape, workers=workers)
+    if centers is None:
+        centers = np.zeros((n, 2))
+
+    def register_one(i):
+        shift, fixed = _correlation_peak(
+            products[i], correlations[i], upsample, radius, centers[i]
+        )
+        return _resolve_shift(imgs1w[i], imgs2w[i], shift, fixed)
+
+    if executor is not None:
+        results = executor.map(register_one, range(n))
+    else:
+        results = map(register_one, range(n))
+    for i, (shift, error) in enumerate(results):
+        shifts[i], errors[i] = shift, error
+    return shifts, errors
+
+
+def _resolve_shift(img1w, img2w, shift, fixed=(False, False)):
     # At this point we may have a shift in the wrong quadrant since the FFT
     # assumes the signal is periodic. We test all four possibilities and return
     # the shift that gives the highest direct correlation (sum of products).
-    shape = np.array(img1.shape)
+    # Along `fixed` axes the peak search was already limited to less than one
+    # period, so the quadrant is known.
+    shape = np.array(img1w.shape)
     shift_pos = (shift + shape) % shape
     shift_neg = shift_pos - shape
-    shifts = list(itertools.product(*zip(shift_pos, shift_neg)))
-    correlations = [
-        np.abs(np.sum(img1w * scipy.ndimage.shift(img2w, s, order=0)))
-        for s in shifts
-    ]
+    shifts = list(itertools.product(*(
+        (s,) if f else (sp, sn)
+        for s, sp, sn, f in zip(shift, shift_pos, shift_neg, fixed)
+    )))
+    correlations = [np.abs(_shifted_dot(img1w, img2w, s)) for s in shifts]
     idx = np.argmax(correlations)
     shift = shifts[idx]
     correlation = correlations[idx]
@@ -53,6 +233,118 @@ def register(img1, img2, sigma, upsample=10):
     return shift, error
 
 
+def _shifted_dot(img1, img2, shift):
+    """Return the sum of products of img1 and img2 shifted by `shift`.
+
+    This is equivalent to np.sum(img1 * scipy.ndimage.shift(img2, shift,
+    order=0)) but only touches the overlapping regions of the two images, and
+    doesn't allocate any temporary arrays.
+
+    """
+    slices1 = []
+    slices2 = []
+    for s, n in zip(shift, img1.shape):
+        # Match ndimage.shift's nearest-neighbor sampling: output pixel i takes
+        # input pixel round_half_up(i - s), and is zero unless 0 <= i - s <=
+        # n - 1.
+        lag = int(np.ceil(s - 0.5))
+        start = max(int(np.ceil(s)), 0)
+        stop = min(int(np.floor(n - 1 + s)) + 1, n)
+        if stop <= start:
+            return 0.0
+        slices1.append(slice(start, stop))
+        slices2.append(slice(start - lag, stop - lag))
+    return np.einsum('ij,ij->', img1[tuple(slices1)], img2[tuple(slices2)])
+
+
+def _correlation_peak(product, correlation, upsample, radius=None,
+                      center=(0, 0)):
+    # Locate the cross-correlation peak given the half cross-power spectrum and
+    # its inverse transform. Also returns which axes had their search limited
+    # by `radius`.
+    shape = np.array(correlation.shape)
+    if radius is None:
+        peak = np.unravel_index(
+            np.argmax(np.abs(correlation)), correlation.shape
+        )
+        shift = np.array(peak, dtype=float)
+        fixed = np.zeros(len(shape), bool)
+    else:
+        shift, fixed = _limited_peak(correlation, radius, center)
+    midpoints = np.fix(shape / 2)
+    wrap = (shift > midpoints) & ~fixed
+    shift[wrap] -= shape[wrap]
+    if upsample > 1:
+        # Refine the peak location by computing the upsampled cross-correlation
+        # in a small neighborhood around it with a matrix-multiply DFT.
+        shift = np.round(shift * upsample) / upsample
+        region_size = int(np.ceil(upsample * 1.5))
+        dftshift = np.fix(region_size / 2.0)
+        offsets = dftshift - shift * upsample
+        correlation = _upsampled_idft_real(
+            product, correlation.shape, region_size, upsample, offsets
+        )
+        peak = np.unravel_index(
+            np.argmax(np.abs(correlation)), correlation.shape
+        )
+        shift += (np.array(peak) - dftshift) / upsample
+    shift[shape == 1] = 0
+    return shift, fixed
+
+
+def _limited_peak(correlation, radius, center):
+    # Search for the peak only among the integer shifts within `radius` of
+    # `center`. Axes where that range spans a whole period are searched in
+    # full as usual.
+    candidates = []
+    fixed = []
+    for n, r, c in zip(correlation.shape, np.broadcast_to(radius, 2), center):
+        lo = int(np.ceil(c - r))
+        hi = max(int(np.floor(c + r)), lo)
+        if hi - lo + 1 < n:
+            candidates.append(np.arange(lo, hi + 1))
+            fixed.append(True)
+        else:
+            candidates.append(np.arange(n))
+            fixed.append(False)
+    window = np.abs(correlation[np.ix_(*(k % n for k, n in zip(
+        candidates, correlation.shape
+    )))])
+    peak = np.unravel_index(np.argmax(window), window.shape)
+    shift = np.array([k[p] for k, p in zip(candidates, peak)], dtype=float)
+    return shift, np.array(fixed)
+
+
+def _upsampled_idft_real(product, shape, region_size, upsample, offsets):
+    # Inverse DFT of a Hermitian spectrum, given as its rfft2 half `product`,
+    # sampled on a region_size x region_size grid at 1/upsample pixel spacing
+    # starting at -offsets. Frequencies follow np.fft.fftfreq to match the
+    # full-spectrum computation in skimage's _upsampled_dft exactly, including
+    # the sign of Nyquist terms.
+    ny, nx = shape
+    uy = (np.arange(region_size) - offsets[0])[:, None]
+    ux = (np.arange(region_size) - offsets[1])[:, None]
+    fy = np.fft.fftfreq(ny, upsample)
+    fx = np.fft.fftfreq(nx, upsample)[:product.shape[1]]
+    kernel_y = np.exp(2j * np.pi * uy * fy)
+    kernel_x = np.exp(2j * np.pi * ux * fx)
+    correlation = kernel_y @ product @ kernel_x.T
+    # The columns of the full spectrum omitted by rfft2 are the conjugates of
+    # columns 1 to m with negated frequencies. Row frequencies are negated too,
+    # except for the Nyquist row which maps onto itself.
+    m = (nx - 1) // 2
+    if m > 0:
+        fy_conj = -fy
+        if ny % 2 == 0:
+            fy_conj[ny // 2] = fy[ny // 2]
+        kernel_y_conj = np.exp(2j * np.pi * uy * fy_conj)
+        correlation += (
+            kernel_y_conj @ product[:, 1:m+1].conj()
+            @ kernel_x[:, 1:m+1].conj().T
+        )
+    return correlation
+
+
 def nccw(img1, img2, sigma):
     img1w = whiten(img1, sigma)
     img2w = whiten(img2, sigma)
@@ -122,6 +414,30 @@ def fourier_shift(img, shift):
     return img_s.real
 
 
+def imread_region(path, key, y, x, h, w):
+    """Read the h x w region with top-left corner (y, x) from a TIFF page.
+
+    Uncompressed pages stored contiguously are memory-mapped so that only the
+    strips covering the region are read from disk. Other pages are decoded in
+    full and then cropped.
+
+    """
+    # See imsave for why we use scikit-image's vendored tifffile.
+    import skimage.external.tifffile
+    with skimage.external.tifffile.TiffFile(path) as tif:
+        page = tif.pages[key]
+        contiguous = page.is_contiguous
+        if contiguous and len(page.shape) == 2:
+            dtype = np.dtype(page.dtype).newbyteorder(tif.byteorder)
+            img = np.memmap(
+                path, dtype=dtype, mode='r', offset=contiguous[0],
+                shape=page.shape
+            )
+            return np.array(img[y:y+h, x:x+w], dtype=dtype.newbyteorder('='))
+        img = page.asarray()
+    return img[y:y+h, x:x+w]
+
+
 def paste(target, img, pos, func=None):
     """Composite img into target."""
     pos = np.array(pos)
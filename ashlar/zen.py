@@ -3,7 +3,7 @@ from urllib.parse import unquote as urllib_unquote
 import xml.etree.ElementTree
 import numpy as np
 import skimage.io
-from . import reg
+from . import reg, utils
 
 
 class ZenMetadata(reg.Metadata):
@@ -85,3 +85,7 @@ class ZenReader(reg.Reader):
         path = self.metadata.image_path(series, c)
         img = skimage.io.imread(str(path), key=0)
         return img
+
+    def read_region(self, series, c, y, x, h, w):
+        path = self.metadata.image_path(series, c)
+        return utils.imread_region(str(path), 0, y, x, h, w)
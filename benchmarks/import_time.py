@@ -0,0 +1,79 @@
+"""Measure how long it takes to import ashlar modules.
+
+Each module is imported in a fresh interpreter so that nothing is cached from a
+previous import. For every module this prints the median wall-clock import
+time over several runs, and which of the heavyweight optional dependencies
+ended up being loaded along with it.
+
+Usage: python benchmarks/import_time.py [-n REPEATS] [MODULE ...]
+
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+
+default_modules = [
+    'ashlar.scripts.ashlar',
+    'ashlar.reg',
+    'ashlar.fileseries',
+    'ashlar.filepattern',
+]
+
+heavy_modules = [
+    'jnius',
+    'matplotlib',
+    'networkx',
+    'sklearn',
+    'skimage.exposure',
+    'skimage.transform',
+]
+
+probe = """
+import importlib, json, sys, time
+t0 = time.perf_counter()
+importlib.import_module(sys.argv[1])
+elapsed = time.perf_counter() - t0
+heavy = [m for m in json.loads(sys.argv[2]) if m in sys.modules]
+print(json.dumps([elapsed, heavy]))
+"""
+
+
+def time_import(module):
+    output = subprocess.run(
+        [sys.executable, '-c', probe, module, json.dumps(heavy_modules)],
+        check=True, stdout=subprocess.PIPE, universal_newlines=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main(argv=sys.argv):
+    parser = argparse.ArgumentParser(
+        description='Measure import time of ashlar modules'
+    )
+    parser.add_argument(
+        'modules', metavar='MODULE', nargs='*', default=default_modules,
+        help='module to import; default is a set of ashlar entry points'
+    )
+    parser.add_argument(
+        '-n', '--repeats', type=int, default=5, metavar='N',
+        help='number of imports to time per module; default is 5'
+    )
+    args = parser.parse_args(argv[1:])
+
+    for module in args.modules:
+        times = []
+        for _ in range(args.repeats):
+            elapsed, heavy = time_import(module)
+            times.append(elapsed)
+        print('{:<28} {:8.3f} s   loads: {}'.format(
+            module, statistics.median(times), ', '.join(heavy) or '-'
+        ))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -19,7 +19,6 @@ requires = [
     # pinning our dependency to the exact latest version.
     # FIXME Release the pin once all the issues are resolved.
     'scikit-image==0.16.2',
-    'scikit-learn>=0.21.1',
     'blessed>=1.17',
 ]
 